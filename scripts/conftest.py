@@ -0,0 +1,124 @@
+"""Shared pytest fixtures: an in-memory Snowflake stand-in and the mock Fabric API"""
+
+import re
+
+import pytest
+
+import rbac_sync_automation
+from fabric_mock_server import MockFabricServer
+
+# test_rbac_setup.py is a connectivity script that needs real credentials and
+# runs on import; keep pytest to the credential-free test modules
+collect_ignore = ['test_rbac_setup.py']
+
+# (role, privilege, granted_on, name) rows served by FakeSnowflakeConnection
+SAMPLE_GRANTS = [
+    ('FINANCE_ADMIN', 'SELECT', 'TABLE', 'FINANCE_DB.AP.INVOICES'),
+    ('FINANCE_ADMIN', 'DELETE', 'TABLE', 'FINANCE_DB.AP.INVOICES'),
+    ('FINANCE_ADMIN', 'USAGE', 'DATABASE', 'FINANCE_DB'),
+    ('FINANCE_ANALYST', 'SELECT', 'TABLE', 'FINANCE_DB.AP.VENDORS'),
+    ('FINANCE_ANALYST', 'USAGE', 'WAREHOUSE', 'COMPUTE_WH'),
+    ('AP_MANAGER', 'INSERT', 'TABLE', 'FINANCE_DB.AP.INVOICES'),
+]
+
+
+class FakeSnowflakeCursor:
+    """Answers SHOW GRANTS TO / OF ROLE from the connection's grant rows"""
+
+    def __init__(self, conn: 'FakeSnowflakeConnection'):
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, sql, params=None, timeout=None):
+        self.conn.queries.append(sql)
+        to_role = re.match(r"SHOW GRANTS TO ROLE (\w+)", sql)
+        if to_role:
+            role = to_role.group(1)
+            if role in self.conn.failing_roles:
+                raise Exception(f"Role '{role}' does not exist or not authorized")
+            self.rows = [('2025-01-01', privilege, granted_on, name, 'ROLE', role, 'false', 'SYSADMIN')
+                         for grant_role, privilege, granted_on, name in self.conn.grants if grant_role == role]
+        elif sql.startswith('SHOW GRANTS OF ROLE'):
+            self.rows = []
+        else:
+            raise Exception("SQL access control error: Insufficient privileges")
+        return self
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        pass
+
+
+class FakeSnowflakeConnection:
+    def __init__(self, grants):
+        self.grants = list(grants)
+        self.failing_roles = set()
+        self.queries = []
+
+    def cursor(self):
+        return FakeSnowflakeCursor(self)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_snowflake(monkeypatch):
+    """Connection every SnowflakeRBACExporter.connect() attaches to; edit .grants / .failing_roles to change Snowflake"""
+    conn = FakeSnowflakeConnection(SAMPLE_GRANTS)
+
+    def connect(self, keep_alive=False):
+        self.conn = conn
+        return True
+
+    monkeypatch.setattr(rbac_sync_automation.SnowflakeRBACExporter, 'connect', connect)
+    return conn
+
+
+@pytest.fixture
+def fabric_server():
+    with MockFabricServer() as server:
+        yield server
+
+
+@pytest.fixture
+def config(fabric_server, tmp_path, monkeypatch):
+    """Orchestrator config against the fakes; reports and exports land in tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    return {
+        'snowflake': {
+            'account': 'test', 'user': 'test', 'password': 'test', 'warehouse': 'COMPUTE_WH',
+            'roles_to_export': ['FINANCE_ADMIN', 'FINANCE_ANALYST', 'AP_MANAGER']
+        },
+        'mapping': {},
+        'identity': {},
+        'output': {'directory': str(tmp_path)},
+        'pipeline': {},
+        'fabric': {
+            'workspace_id': 'ws-test', 'tenant_id': 'tenant', 'client_id': 'client', 'client_secret': 'secret',
+            'api_base_url': fabric_server.api_base_url, 'login_base_url': fabric_server.base_url,
+            'rate_limit': 1000.0, 'max_retries': 1
+        }
+    }
+
+
+@pytest.fixture
+def role_emails(monkeypatch):
+    """<ROLE>_EMAIL for every SAMPLE_GRANTS role, so each one maps to a Fabric user"""
+    emails = {role: f"{role.lower()}@contoso.com" for role in dict.fromkeys(role for role, *_ in SAMPLE_GRANTS)}
+    for role, email in emails.items():
+        monkeypatch.setenv(f"{role}_EMAIL", email)
+    return emails
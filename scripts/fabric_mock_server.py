@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+FabCon Global Hack 2025 - Local Fabric / Entra ID API Stand-in
+Mock token and workspace-user endpoints for exercising the sync at scale
+
+Serves the subset of the APIs FabricWorkspaceSync uses:
+    POST   /{tenant}/oauth2/v2.0/token
+    GET    /v1.0/myorg/groups/{workspace}/users       ($top / $skip paging)
+    POST   /v1.0/myorg/groups/{workspace}/users       (add)
+    PUT    /v1.0/myorg/groups/{workspace}/users       (update)
+    DELETE /v1.0/myorg/groups/{workspace}/users/{id}  (remove)
+
+Latency, random 5xx errors, a 429 request quota and the maximum page size
+are configurable. Point the sync at it with:
+    FABRIC_API_BASE_URL=http://127.0.0.1:8765/v1.0/myorg
+    FABRIC_LOGIN_BASE_URL=http://127.0.0.1:8765
+
+Author: Tyler Rabiger
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+USERS_PATH = re.compile(r'^/v1\.0/myorg/groups/(?P<workspace>[^/]+)/users(?:/(?P<identifier>[^/]+))?$')
+TOKEN_PATH = re.compile(r'^/(?P<tenant>[^/]+)/oauth2/v2\.0/token$')
+
+
+class MockFabricState:
+    """Workspace membership, request quota and counters shared by all handler threads"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: Optional[float] = None, retry_after: int = 1, max_page_size: int = 1000,
+                 token_lifetime: int = 3600, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.max_page_size = max_page_size
+        self.token_lifetime = token_lifetime
+        self.random = random.Random(seed)
+        self.workspaces: Dict[str, Dict[str, Dict]] = {}
+        self.stats = {'requests': 0, 'tokens': 0, 'throttled': 0, 'errors': 0}
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def reset(self, workspaces: Optional[Dict[str, Dict[str, Dict]]] = None):
+        with self._lock:
+            self.workspaces = workspaces or {}
+            self.stats = {key: 0 for key in self.stats}
+
+    def seed_users(self, workspace_id: str, count: int, role: str = 'Viewer', prefix: str = 'user'):
+        """Pre-populate a workspace with `count` synthetic users"""
+        with self._lock:
+            users = self.workspaces.setdefault(workspace_id, {})
+            for i in range(count):
+                email = f"{prefix}{i:06d}@loadtest.local"
+                users[email.lower()] = {'emailAddress': email, 'identifier': email,
+                                        'groupUserAccessRight': role, 'principalType': 'User'}
+
+    def admit(self) -> Optional[int]:
+        """Count a request; returns a Retry-After delay when it exceeds the quota or draws an error"""
+        with self._lock:
+            self.stats['requests'] += 1
+            if self.rate_limit:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start = now
+                    self._window_count = 0
+                self._window_count += 1
+                if self._window_count > self.rate_limit:
+                    self.stats['throttled'] += 1
+                    return self.retry_after
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return -1
+        return None
+
+    def delay(self):
+        if self.latency_ms or self.jitter_ms:
+            time.sleep(max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+
+class MockFabricHandler(BaseHTTPRequestHandler):
+    """Routes requests to MockFabricState; keep-alive so pooled clients reuse connections"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    @property
+    def state(self) -> MockFabricState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Optional[Dict] = None, headers: Optional[Dict] = None):
+        payload = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _handle(self, method: str):
+        raw = self._read_body()
+        parsed = urlparse(self.path)
+        self.state.delay()
+
+        token_match = TOKEN_PATH.match(parsed.path)
+        if method == 'POST' and token_match:
+            with self.state._lock:
+                self.state.stats['tokens'] += 1
+            return self._send(200, {
+                'token_type': 'Bearer',
+                'expires_in': self.state.token_lifetime,
+                'access_token': f"mock-{token_match.group('tenant')}-{time.time():.0f}"
+            })
+
+        users_match = USERS_PATH.match(parsed.path)
+        if not users_match:
+            return self._send(404, {'error': {'code': 'NotFound'}})
+        if not (self.headers.get('Authorization') or '').startswith('Bearer '):
+            return self._send(401, {'error': {'code': 'TokenNotProvided'}})
+
+        verdict = self.state.admit()
+        if verdict is not None:
+            if verdict < 0:
+                return self._send(503, {'error': {'code': 'ServiceUnavailable'}})
+            return self._send(429, {'error': {'code': 'TooManyRequests'}},
+                              headers={'Retry-After': str(verdict)})
+
+        workspace_id = users_match.group('workspace')
+        identifier = users_match.group('identifier')
+        with self.state._lock:
+            users = self.state.workspaces.setdefault(workspace_id, {})
+            if method == 'GET':
+                query = parse_qs(parsed.query)
+                top = min(int(query.get('$top', [self.state.max_page_size])[0]), self.state.max_page_size)
+                skip = int(query.get('$skip', [0])[0])
+                page = list(users.values())[skip:skip + top]
+                body = {'value': page}
+                if skip + top < len(users):
+                    body['@odata.nextLink'] = (f"http://{self.headers.get('Host')}{parsed.path}"
+                                               f"?$top={top}&$skip={skip + top}")
+                return self._send(200, body)
+
+            if method == 'DELETE':
+                if users.pop(unquote(identifier or '').lower(), None) is None:
+                    return self._send(404, {'error': {'code': 'UserNotFound'}})
+                return self._send(200)
+
+            payload = json.loads(raw or b'{}')
+            email = payload.get('identifier', '')
+            if method == 'PUT' and email.lower() not in users:
+                return self._send(404, {'error': {'code': 'UserNotFound'}})
+            principal_type = payload.get('principalType', 'User')
+            users[email.lower()] = {
+                'identifier': email,
+                'groupUserAccessRight': payload.get('groupUserAccessRight'),
+                'principalType': principal_type
+            }
+            if principal_type == 'User':
+                users[email.lower()]['emailAddress'] = email
+        return self._send(200)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class MockFabricServer:
+    """Threaded mock server that can run in the background of a test or load run"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, **state_options):
+        self.state = MockFabricState(**state_options)
+        self.httpd = ThreadingHTTPServer((host, port), MockFabricHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_base_url(self) -> str:
+        return f"{self.base_url}/v1.0/myorg"
+
+    def start(self) -> 'MockFabricServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Local Fabric / Entra ID API stand-in for RBAC sync testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='mean per-request latency')
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help='uniform +/- latency jitter')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of user calls that return 503')
+    parser.add_argument('--rate-limit', type=float, default=None, help='user calls per second before 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429')
+    parser.add_argument('--max-page-size', type=int, default=1000, help='largest page returned by GET users')
+    parser.add_argument('--seed-workspace', default=None, help='workspace id to pre-populate')
+    parser.add_argument('--seed-users', type=int, default=0, help='number of users to pre-populate')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = MockFabricServer(
+        args.host, args.port,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, retry_after=args.retry_after, max_page_size=args.max_page_size
+    )
+    if args.seed_workspace and args.seed_users:
+        server.state.seed_users(args.seed_workspace, args.seed_users)
+
+    print("=" * 80)
+    print("FABRIC MOCK SERVER")
+    print("=" * 80)
+    print(f"   FABRIC_API_BASE_URL={server.api_base_url}")
+    print(f"   FABRIC_LOGIN_BASE_URL={server.base_url}")
+    print("   Press Ctrl+C to stop")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"\n📊 {server.state.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+FabCon Global Hack 2025 - RBAC Sync Load Test
+Drives the Fabric sync path with synthetic permissions and reports
+throughput and latency percentiles per concurrency setting
+
+By default a fabric_mock_server.py instance is started in-process; pass
+--api-base-url / --login-base-url to target an already running stand-in.
+Use the results to size FABRIC_SYNC_CONCURRENCY and FABRIC_RATE_LIMIT.
+
+Author: Tyler Rabiger
+"""
+
+import argparse
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from fabric_mock_server import MockFabricServer
+from rbac_sync_automation import (
+    AsyncPermissionSyncEngine,
+    FabricPermission,
+    FabricWorkspaceSync,
+    TokenProvider,
+    FABRIC_API_SCOPE
+)
+
+ROLES = ['Viewer', 'Contributor', 'Member', 'Admin']
+
+
+def synthetic_permissions(count: int) -> List[FabricPermission]:
+    """Deterministic permissions spread over the four Fabric roles"""
+    return [
+        FabricPermission(
+            email=f"user{i:06d}@loadtest.local",
+            role=ROLES[i % len(ROLES)],
+            snowflake_role=f"LOADTEST_ROLE_{i % 50:02d}",
+            grant_count=1,
+            reasoning='synthetic load-test permission'
+        )
+        for i in range(count)
+    ]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class TimedSyncer(FabricWorkspaceSync):
+    """FabricWorkspaceSync that records the latency of every API call"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies: List[float] = []
+        self._latency_lock = threading.Lock()
+
+    def request_workspace_user(self, action, permission):
+        start = time.perf_counter()
+        try:
+            return super().request_workspace_user(action, permission)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._latency_lock:
+                self.latencies.append(elapsed)
+
+
+def run_scenario(args, permissions: List[FabricPermission], concurrency: int,
+                 api_base_url: str, login_base_url: str) -> Dict:
+    """Sync every permission at one concurrency setting and summarise the run"""
+    token_provider = TokenProvider('loadtest-tenant', 'loadtest-client', 'secret', FABRIC_API_SCOPE,
+                                   login_base_url=login_base_url)
+    syncer = TimedSyncer(
+        workspace_id=args.workspace_id, tenant_id='loadtest-tenant', client_id='loadtest-client',
+        client_secret='secret', pool_size=max(20, concurrency), max_retries=args.max_retries,
+        token_provider=token_provider, api_base_url=api_base_url
+    )
+    try:
+        syncer.authenticate()
+        operations = [('add', p) for p in permissions]
+        if args.reconcile:
+            plan = syncer.plan_reconciliation(permissions, syncer.iter_workspace_users(),
+                                              allow_removals=args.allow_removals)
+            operations = ([('add', p) for p in plan.adds] + [('update', p) for p in plan.updates] +
+                          [('remove', FabricPermission(u['emailAddress'], u['groupUserAccessRight'], '', 0, ''))
+                           for u in plan.removes])
+
+        engine = AsyncPermissionSyncEngine(syncer, concurrency=concurrency, rate_per_second=args.client_rate)
+        start = time.perf_counter()
+        results = engine.run(operations)
+        elapsed = time.perf_counter() - start
+
+        read_start = time.perf_counter()
+        member_count = sum(1 for _ in syncer.iter_workspace_users())
+        read_elapsed = time.perf_counter() - read_start
+    finally:
+        syncer.close()
+
+    latencies = sorted(syncer.latencies)
+    return {
+        'concurrency': concurrency,
+        'operations': len(operations),
+        'succeeded': sum(r['success'] for r in results),
+        'elapsed': elapsed,
+        'throughput': len(operations) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'throttled': engine.stats['throttled'],
+        'failed': engine.stats['failed'],
+        'members': member_count,
+        'read_seconds': read_elapsed
+    }
+
+
+def print_results(results: List[Dict]):
+    print()
+    print(f"{'conc':>5} {'ops':>7} {'ok':>7} {'secs':>8} {'ops/s':>9} {'p50ms':>8} {'p95ms':>8} "
+          f"{'p99ms':>8} {'429s':>6} {'fail':>5} {'read s':>7}")
+    for r in results:
+        print(f"{r['concurrency']:>5} {r['operations']:>7} {r['succeeded']:>7} {r['elapsed']:>8.2f} "
+              f"{r['throughput']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['throttled']:>6} {r['failed']:>5} {r['read_seconds']:>7.2f}")
+    best = max(results, key=lambda r: r['throughput'])
+    print(f"\n✅ Best throughput: {best['throughput']:.1f} ops/s at concurrency {best['concurrency']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the Fabric permission sync against a mock API')
+    parser.add_argument('--permissions', type=int, default=20000, help='synthetic permissions per run')
+    parser.add_argument('--concurrency', default='1,4,8,16,32', help='comma-separated settings to sweep')
+    parser.add_argument('--client-rate', type=float, default=1000.0, help='client-side calls/second budget')
+    parser.add_argument('--max-retries', type=int, default=5, help='5xx / connection retries per call')
+    parser.add_argument('--workspace-id', default='loadtest-workspace')
+    parser.add_argument('--existing-users', type=int, default=0,
+                        help='users already in the workspace before each run (mock server only)')
+    parser.add_argument('--reconcile', action='store_true', help='plan against current membership first')
+    parser.add_argument('--allow-removals', action='store_true')
+    parser.add_argument('--api-base-url', default=None, help='use an already running stand-in')
+    parser.add_argument('--login-base-url', default=None)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='in-process mock: mean latency')
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help='in-process mock: latency jitter')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='in-process mock: 503 fraction')
+    parser.add_argument('--server-rate-limit', type=float, default=None, help='in-process mock: 429 quota')
+    parser.add_argument('--retry-after', type=int, default=1, help='in-process mock: Retry-After seconds')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    permissions = synthetic_permissions(args.permissions)
+    settings = [int(c) for c in args.concurrency.split(',') if c.strip()]
+
+    print("=" * 80)
+    print("RBAC SYNC - LOAD TEST")
+    print("=" * 80)
+    print(f"   {len(permissions)} permissions, concurrency sweep {settings}")
+
+    server = None
+    if args.api_base_url:
+        api_base_url, login_base_url = args.api_base_url, args.login_base_url or args.api_base_url
+    else:
+        server = MockFabricServer(
+            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+            rate_limit=args.server_rate_limit, retry_after=args.retry_after
+        ).start()
+        api_base_url, login_base_url = server.api_base_url, server.base_url
+        print(f"   Mock server at {server.base_url} (latency {args.latency_ms}±{args.jitter_ms} ms, "
+              f"errors {args.error_rate:.1%}, quota {args.server_rate_limit or 'unlimited'} req/s)")
+
+    results = []
+    try:
+        for concurrency in settings:
+            if server:
+                server.state.reset()
+                if args.existing_users:
+                    server.state.seed_users(args.workspace_id, args.existing_users)
+            print(f"\n🚀 Concurrency {concurrency}...")
+            results.append(run_scenario(args, permissions, concurrency, api_base_url, login_base_url))
+    finally:
+        if server:
+            server.stop()
+
+    print_results(results)
+    return 0 if all(r['failed'] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
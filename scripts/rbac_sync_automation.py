@@ -12,34 +12,242 @@ Date: October 2025
 """
 
 import os
+import sys
 import json
 import logging
+import argparse
+import asyncio
 import csv
-from datetime import datetime
-from typing import Dict, List, Tuple
-import snowflake.connector
-import requests
-from dataclasses import dataclass
-
-# Optional pandas import - use built-in csv if pandas not available
-try:
-    import pandas as pd
-    HAS_PANDAS = True
-except ImportError:
-    HAS_PANDAS = False
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f'rbac_sync_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'),
-        logging.StreamHandler()
-    ]
-)
+import functools
+import hashlib
+import importlib.util
+import queue
+import signal
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+from contextlib import contextmanager
+from urllib.parse import quote, urlparse
+from dataclasses import asdict, dataclass, field, replace
+
+# Heavy dependencies (snowflake-connector, requests, pandas, pyarrow) are
+# imported inside the code paths that use them, so --help and the offline
+# commands start instantly. Optional ones are only probed for here.
+HAS_PANDAS = importlib.util.find_spec('pandas') is not None
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 logger = logging.getLogger(__name__)
 
 
+def configure_logging(level: str = 'INFO', log_file: Optional[str] = None):
+    """Log to the console and, when log_file is given, to that file as well"""
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    logging.basicConfig(level=getattr(logging, level.upper(), logging.INFO), format=LOG_FORMAT,
+                        handlers=handlers, force=True)
+
+
+# Histogram buckets in seconds, from single API calls up to whole phases
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+METRIC_HELP = {
+    'rbac_sync_phase_seconds': 'Wall time of each migration phase',
+    'rbac_sync_snowflake_query_seconds': 'Snowflake statement execution time',
+    'rbac_sync_snowflake_query_errors_total': 'Snowflake statements that raised',
+    'rbac_sync_mapper_seconds': 'Time spent in FabricPermissionMapper operations',
+    'rbac_sync_http_request_seconds': 'HTTP call time to response headers, including transport retries',
+    'rbac_sync_http_retries_total': 'Transport-level retries (5xx and dropped connections)',
+    'rbac_sync_http_throttled_total': 'HTTP 429 responses',
+    'rbac_sync_fabric_operation_seconds': 'Workspace user add / update / remove calls, including 401 refreshes',
+    'rbac_sync_output_bytes_total': 'Bytes written to export, mapping and report files'
+}
+
+
+class MetricsRegistry:
+    """Thread-safe counters and latency histograms for one process
+    
+    Rendered as a Prometheus textfile (for node_exporter's textfile
+    collector) or as a JSON summary with estimated percentiles.
+    """
+    
+    def __init__(self, buckets: Tuple[float, ...] = METRIC_BUCKETS):
+        self.buckets = buckets
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.histograms: Dict[Tuple[str, Tuple], Dict] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = {'buckets': [0] * (len(self.buckets) + 1),
+                                                 'count': 0, 'sum': 0.0, 'max': 0.0}
+            index = 0
+            while index < len(self.buckets) and value > self.buckets[index]:
+                index += 1
+            series['buckets'][index] += 1
+            series['count'] += 1
+            series['sum'] += value
+            series['max'] = max(series['max'], value)
+    
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+    
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+    
+    def _quantile(self, series: Dict, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        rank = q * series['count']
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets + (series['max'],), series['buckets']):
+            if count and seen + count >= rank:
+                return min(lower + (bound - lower) * (rank - seen) / count, series['max'])
+            seen += count
+            lower = bound
+        return series['max']
+    
+    def summary(self) -> Dict:
+        """Counters and histogram statistics as plain JSON-ready data"""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: dict(series, buckets=list(series['buckets'])) for key, series in self.histograms.items()}
+        result = {'counters': {}, 'histograms': {}}
+        for (name, labels), value in sorted(counters.items()):
+            result['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        for (name, labels), series in sorted(histograms.items()):
+            result['histograms'].setdefault(name, []).append({
+                'labels': dict(labels),
+                'count': series['count'],
+                'sum': round(series['sum'], 6),
+                'mean': round(series['sum'] / series['count'], 6),
+                'max': round(series['max'], 6),
+                'p50': round(self._quantile(series, 0.50), 6),
+                'p95': round(self._quantile(series, 0.95), 6),
+                'p99': round(self._quantile(series, 0.99), 6)
+            })
+        return result
+    
+    def total(self, name: str) -> float:
+        """Sum of a counter, or of a histogram's observation count, across all labels"""
+        with self._lock:
+            if name in {key[0] for key in self.counters}:
+                return sum(value for (metric, _), value in self.counters.items() if metric == name)
+            return sum(series['count'] for (metric, _), series in self.histograms.items() if metric == name)
+    
+    @staticmethod
+    def _labels(labels: Tuple, **extra) -> str:
+        parts = []
+        for key, value in (*labels, *extra.items()):
+            escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            parts.append(f'{key}="{escaped}"')
+        return '{' + ','.join(parts) + '}' if parts else ''
+    
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, dict(series, buckets=list(series['buckets'])))
+                                for key, series in self.histograms.items())
+        lines = []
+        described = set()
+        
+        def describe(name: str, kind: str):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+        
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+        for (name, labels), series in histograms:
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{name}_bucket{self._labels(labels, le=le)} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels)} {series['sum']:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {series['count']}")
+        return "\n".join(lines) + "\n"
+    
+    @staticmethod
+    def _write_atomic(path: str, text: str):
+        # The textfile collector may read at any moment; never expose a partial file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    
+    def write_prometheus(self, path: str):
+        self._write_atomic(path, self.to_prometheus())
+    
+    def write_summary(self, path: str, extra: Optional[Dict] = None):
+        summary = {'generated_at': datetime.now().isoformat(timespec='seconds'), **(extra or {}), **self.summary()}
+        self._write_atomic(path, json.dumps(summary, indent=2))
+
+
+# Process-wide registry shared by the exporter, mapper, sync and orchestrator
+metrics = MetricsRegistry()
+
+
+def timed(name: str, **labels):
+    """Decorator recording each call's duration in the histogram `name`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+# Set-based export source (requires IMPORTED PRIVILEGES on the SNOWFLAKE database)
+ACCOUNT_USAGE_GRANTS_VIEW = 'SNOWFLAKE.ACCOUNT_USAGE.GRANTS_TO_ROLES'
+ACCOUNT_USAGE_MEMBERS_VIEW = 'SNOWFLAKE.ACCOUNT_USAGE.GRANTS_TO_USERS'
+ACCOUNT_USAGE_USERS_VIEW = 'SNOWFLAKE.ACCOUNT_USAGE.USERS'
+ACCOUNT_USAGE_BATCH_SIZE = 500
+# ACCOUNT_USAGE lags live grants by up to 2 hours; incremental runs re-read this window
+ACCOUNT_USAGE_LATENCY = timedelta(hours=3)
+
+
+def _qualified_name(granted_on: str, catalog: str, schema: str, name: str) -> str:
+    """Rebuild the dotted object name SHOW GRANTS returns from ACCOUNT_USAGE columns"""
+    if granted_on == 'DATABASE' or not catalog:
+        return name
+    if granted_on == 'SCHEMA' or not schema:
+        return f"{catalog}.{name}"
+    return f"{catalog}.{schema}.{name}"
+
+
 @dataclass
 class SnowflakeGrant:
     """Represents a single Snowflake grant"""
@@ -48,6 +256,395 @@ class SnowflakeGrant:
     granted_on: str
     name: str
     granted_by: str
+    created_on: Optional[str] = None
+
+    def key(self) -> Tuple[str, str, str]:
+        """Identity of the grant within its role"""
+        return (self.privilege, self.granted_on, self.name)
+
+
+def _timestamp(value) -> Optional[str]:
+    """Normalise a Snowflake timestamp column to an ISO-8601 string"""
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+GRANT_CSV_FIELDS = ['role', 'privilege', 'granted_on', 'name', 'granted_by']
+STREAM_BATCH_SIZE = 10000
+
+
+class StreamedGrants:
+    """Grants for one role that were streamed to a CSV file instead of kept in memory
+    
+    Iterating re-reads the file lazily, and len() returns the count recorded
+    while writing, so it can stand in for a List[SnowflakeGrant] in mapping
+    and reporting.
+    """
+    
+    def __init__(self, path: str, count: int):
+        self.path = path
+        self.count = count
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __iter__(self) -> Iterator[SnowflakeGrant]:
+        with open(self.path, newline='') as csvfile:
+            for row in csv.DictReader(csvfile):
+                yield SnowflakeGrant(**row)
+
+
+class StringPool:
+    """Interns strings to compact integer codes shared between GrantTables"""
+    
+    def __init__(self):
+        self.strings: List[str] = []
+        self._codes: Dict[str, int] = {}
+    
+    def intern(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self._codes[value] = code
+            self.strings.append(value)
+        return code
+    
+    def code(self, value: str) -> Optional[int]:
+        """Code for a value, or None if it has never been interned"""
+        return self._codes.get(value)
+
+
+class GrantTable:
+    """Compact columnar grant storage with interned strings
+    
+    Each column is an array of integer codes into a shared StringPool, so the
+    heavily repeated values (privilege names, object types, grantor roles)
+    are stored once. Iterating yields SnowflakeGrant objects, so a GrantTable
+    can be used anywhere a List[SnowflakeGrant] is expected, but doing so
+    builds the objects again; hot paths read the code columns directly.
+    filter() and by_role() use per-column row indexes built on first use, so
+    repeated lookups cost the matching rows rather than a full scan.
+    created_on is not retained.
+    """
+    
+    COLUMNS = ('role', 'privilege', 'granted_on', 'name', 'granted_by')
+    
+    def __init__(self, pool: Optional[StringPool] = None):
+        self.pool = pool or StringPool()
+        self.columns: Dict[str, array] = {column: array('I') for column in self.COLUMNS}
+        self._indexes: Dict[str, Dict[int, array]] = {}
+    
+    @classmethod
+    def from_grants(cls, grants, pool: Optional[StringPool] = None) -> 'GrantTable':
+        table = cls(pool)
+        table.extend(grants)
+        return table
+    
+    def append(self, grant: SnowflakeGrant, role: Optional[str] = None):
+        """Add a grant, optionally filing it under a different role (e.g. an inheriting one)"""
+        if self._indexes:
+            self._indexes = {}
+        intern = self.pool.intern
+        self.columns['role'].append(intern(role or grant.role))
+        self.columns['privilege'].append(intern(grant.privilege))
+        self.columns['granted_on'].append(intern(grant.granted_on))
+        self.columns['name'].append(intern(grant.name))
+        self.columns['granted_by'].append(intern(grant.granted_by))
+    
+    def extend(self, grants, role: Optional[str] = None):
+        for grant in grants:
+            self.append(grant, role)
+    
+    def __len__(self) -> int:
+        return len(self.columns['role'])
+    
+    def __iter__(self) -> Iterator[SnowflakeGrant]:
+        for values in self.rows():
+            yield SnowflakeGrant(*values)
+    
+    def rows(self) -> Iterator[Tuple[str, str, str, str, str]]:
+        """Yield plain string tuples in COLUMNS order"""
+        strings = self.pool.strings
+        for codes in zip(*(self.columns[column] for column in self.COLUMNS)):
+            yield tuple(strings[code] for code in codes)
+    
+    @classmethod
+    def concat(cls, tables: List['GrantTable'], roles: Optional[List[str]] = None) -> 'GrantTable':
+        """Join tables, copying code arrays directly when they share a pool
+        
+        With roles given, every row of tables[i] is filed under roles[i]
+        instead of keeping its own role (e.g. effective grants, which keep
+        the role they were inherited from).
+        """
+        if not tables:
+            return cls()
+        pool = tables[0].pool
+        combined = cls(pool)
+        for i, table in enumerate(tables):
+            role = roles[i] if roles else None
+            if table.pool is pool:
+                for column in cls.COLUMNS:
+                    if column == 'role' and role is not None:
+                        combined.columns['role'].extend(array('I', [pool.intern(role)]) * len(table))
+                    else:
+                        combined.columns[column].extend(table.columns[column])
+            else:
+                combined.extend(table, role)
+        return combined
+    
+    def to_columns(self) -> Dict[str, List[str]]:
+        """Decode every column to a list of strings (e.g. for a DataFrame)"""
+        strings = self.pool.strings
+        return {column: [strings[code] for code in codes] for column, codes in self.columns.items()}
+    
+    def _take(self, indices) -> 'GrantTable':
+        subset = GrantTable(self.pool)
+        for column, codes in self.columns.items():
+            subset.columns[column] = array('I', (codes[i] for i in indices))
+        return subset
+    
+    def _index(self, column: str) -> Dict[int, array]:
+        """Row numbers for each code in a column, built once per column"""
+        index = self._indexes.get(column)
+        if index is None:
+            index = {}
+            for i, code in enumerate(self.columns[column]):
+                rows = index.get(code)
+                if rows is None:
+                    rows = index[code] = array('I')
+                rows.append(i)
+            self._indexes[column] = index
+        return index
+    
+    def filter(self, role=None, privilege=None, granted_on=None) -> 'GrantTable':
+        """Rows matching every given criterion; each accepts a value or a collection"""
+        selected = None
+        for column, wanted in (('role', role), ('privilege', privilege), ('granted_on', granted_on)):
+            if wanted is None:
+                continue
+            values = [wanted] if isinstance(wanted, str) else wanted
+            index = self._index(column)
+            rows = set()
+            for value in values:
+                rows.update(index.get(self.pool.code(value), ()))
+            selected = rows if selected is None else selected & rows
+        
+        if selected is None:
+            return self._take(range(len(self)))
+        return self._take(sorted(selected))
+    
+    def partition(self, granted_on: str) -> Tuple['GrantTable', 'GrantTable']:
+        """Split into rows on the given object type and all other rows, in one pass"""
+        code = self.pool.code(granted_on)
+        matching, other = [], []
+        for i, value in enumerate(self.columns['granted_on']):
+            (matching if value == code else other).append(i)
+        return self._take(matching), self._take(other)
+    
+    def column_values(self, column: str) -> List[str]:
+        """Decode a single column to strings"""
+        strings = self.pool.strings
+        return [strings[code] for code in self.columns[column]]
+    
+    def roles(self) -> List[str]:
+        """Distinct roles in first-seen order"""
+        strings = self.pool.strings
+        return [strings[code] for code in dict.fromkeys(self.columns['role'])]
+    
+    def by_role(self) -> Dict[str, 'GrantTable']:
+        """Split into one table per role in a single pass"""
+        strings = self.pool.strings
+        return {strings[code]: self._take(rows) for code, rows in self._index('role').items()}
+
+
+class GrantSnapshot:
+    """Local JSON snapshot of exported grants plus per-role ACCOUNT_USAGE change watermarks
+    
+    Each role keeps its own watermark, so exporting one set of roles never
+    advances the watermark of roles that were not part of that export.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.watermarks: Dict[str, str] = {}
+        self.grants: Dict[str, Dict[Tuple[str, str, str], SnowflakeGrant]] = {}
+    
+    def load(self) -> bool:
+        """Load the snapshot from disk, returning False if none exists yet"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            data = json.load(f)
+        self.grants = {
+            role: {grant.key(): grant for grant in (SnowflakeGrant(**g) for g in grants)}
+            for role, grants in data.get('grants', {}).items()
+        }
+        self.watermarks = data.get('watermarks', {})
+        if 'watermark' in data:
+            # Older snapshots kept one global watermark; a changes-only merge
+            # from it can miss roles, so treat them as needing a full export
+            self.watermarks = {}
+        return True
+    
+    def save(self):
+        """Atomically write the snapshot to disk"""
+        data = {
+            'watermarks': self.watermarks,
+            'grants': {
+                role: [asdict(g) for g in grants.values()]
+                for role, grants in self.grants.items()
+            }
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+    
+    def replace_role(self, role: str, grants: List[SnowflakeGrant]):
+        """Overwrite a role's grants with a full export"""
+        self.grants[role] = {grant.key(): grant for grant in grants}
+    
+    def roles_by_watermark(self, roles: List[str]) -> Dict[str, List[str]]:
+        """Group the roles that have a watermark by it, so each group is one changes query"""
+        groups: Dict[str, List[str]] = {}
+        for role in roles:
+            if role in self.grants and self.watermarks.get(role):
+                groups.setdefault(self.watermarks[role], []).append(role)
+        return groups
+    
+    def apply_change(self, grant: SnowflakeGrant, deleted: bool):
+        """Merge one added or revoked grant into the snapshot"""
+        role_grants = self.grants.setdefault(grant.role, {})
+        if deleted:
+            role_grants.pop(grant.key(), None)
+        else:
+            role_grants[grant.key()] = grant
+    
+    def role_grants(self, role: str) -> List[SnowflakeGrant]:
+        return list(self.grants.get(role, {}).values())
+
+
+# Privileges that let a role change data in an object
+WRITE_PRIVILEGES = ('INSERT', 'UPDATE', 'DELETE', 'TRUNCATE')
+
+
+class GrantStore:
+    """Indexed local SQLite store of exported grants with run history
+    
+    Every export is recorded as a run, so audit questions ("which roles can
+    write INVOICES", "what changed since the last run") are answered from
+    indexes instead of re-parsing CSVs or re-querying Snowflake.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            role_count INTEGER NOT NULL,
+            grant_count INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS grants (
+            run_id INTEGER NOT NULL REFERENCES runs(run_id),
+            role TEXT NOT NULL,
+            privilege TEXT NOT NULL,
+            granted_on TEXT NOT NULL,
+            name TEXT NOT NULL,
+            object_name TEXT NOT NULL,
+            granted_by TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_grants_run_role ON grants(run_id, role);
+        CREATE INDEX IF NOT EXISTS idx_grants_run_object ON grants(run_id, object_name, privilege);
+        CREATE INDEX IF NOT EXISTS idx_grants_run_privilege ON grants(run_id, privilege);
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+    
+    def record_run(self, grants_by_role: Dict[str, List[SnowflakeGrant]]) -> int:
+        """Store one export run and return its run_id"""
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (started_at, role_count, grant_count) VALUES (?, ?, ?)",
+                (datetime.now().isoformat(), len(grants_by_role), sum(len(g) for g in grants_by_role.values()))
+            )
+            run_id = cursor.lastrowid
+            for grants in grants_by_role.values():
+                self.conn.executemany(
+                    "INSERT INTO grants (run_id, role, privilege, granted_on, name, object_name, granted_by) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((run_id, g.role, g.privilege, g.granted_on, g.name, g.name.split('.')[-1], g.granted_by)
+                     for g in grants)
+                )
+        logger.info(f"🗄️  Recorded run {run_id} in grant store: {self.path}")
+        return run_id
+    
+    def runs(self) -> List[Dict]:
+        """Run history, newest first"""
+        rows = self.conn.execute(
+            "SELECT run_id, started_at, role_count, grant_count FROM runs ORDER BY run_id DESC"
+        ).fetchall()
+        return [dict(zip(('run_id', 'started_at', 'role_count', 'grant_count'), row)) for row in rows]
+    
+    def latest_run_id(self, offset: int = 0) -> Optional[int]:
+        """run_id of the newest run, or of the run `offset` runs before it"""
+        row = self.conn.execute(
+            "SELECT run_id FROM runs ORDER BY run_id DESC LIMIT 1 OFFSET ?", (offset,)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def role_grants(self, role: str, run_id: Optional[int] = None) -> List[SnowflakeGrant]:
+        """A role's grants in a run (default: latest)"""
+        run_id = run_id or self.latest_run_id()
+        rows = self.conn.execute(
+            "SELECT role, privilege, granted_on, name, granted_by FROM grants WHERE run_id = ? AND role = ?",
+            (run_id, role)
+        ).fetchall()
+        return [SnowflakeGrant(*row) for row in rows]
+    
+    def roles_with_privilege(self, object_name: str, privileges=WRITE_PRIVILEGES,
+                             run_id: Optional[int] = None) -> List[str]:
+        """Roles holding any of the privileges on an object, by short or qualified name"""
+        run_id = run_id or self.latest_run_id()
+        object_name = object_name.upper()
+        placeholders = ', '.join(['?'] * len(privileges))
+        params = [run_id, object_name.split('.')[-1], *privileges]
+        
+        name_filter = ""
+        if '.' in object_name:
+            name_filter = "AND name = ? "
+            params.append(object_name)
+        
+        rows = self.conn.execute(
+            f"SELECT DISTINCT role FROM grants WHERE run_id = ? AND object_name = ? "
+            f"AND privilege IN ({placeholders}) {name_filter}ORDER BY role",
+            params
+        ).fetchall()
+        return [row[0] for row in rows]
+    
+    def diff_runs(self, old_run_id: Optional[int] = None,
+                  new_run_id: Optional[int] = None) -> Dict[str, List[SnowflakeGrant]]:
+        """Grants added and removed between two runs (default: previous vs latest)"""
+        new_run_id = new_run_id or self.latest_run_id()
+        old_run_id = old_run_id or self.latest_run_id(offset=1)
+        
+        query = (
+            "SELECT role, privilege, granted_on, name, granted_by FROM grants WHERE run_id = ? "
+            "EXCEPT SELECT role, privilege, granted_on, name, granted_by FROM grants WHERE run_id = ?"
+        )
+        added = self.conn.execute(query, (new_run_id, old_run_id)).fetchall()
+        removed = self.conn.execute(query, (old_run_id, new_run_id)).fetchall()
+        return {
+            'added': [SnowflakeGrant(*row) for row in added],
+            'removed': [SnowflakeGrant(*row) for row in removed]
+        }
+    
+    def close(self):
+        self.conn.close()
 
 
 @dataclass
@@ -58,6 +655,317 @@ class FabricPermission:
     snowflake_role: str
     grant_count: int
     reasoning: str
+    principal_id: Optional[str] = None  # Directory object ID, once resolved
+    principal_type: str = 'User'  # 'Group' when a role is assigned through a security group
+
+
+MAPPING_CSV_FIELDS = ['snowflake_role', 'fabric_role', 'user_email', 'grant_count', 'reasoning']
+
+
+def _grant_rows(grants) -> Iterator[Tuple[str, ...]]:
+    """Rows in GRANT_CSV_FIELDS order from a list of SnowflakeGrant or a GrantTable"""
+    if isinstance(grants, GrantTable):
+        return grants.rows()
+    return ((g.role, g.privilege, g.granted_on, g.name, g.granted_by) for g in grants)
+
+
+def _write_grants_csv(filename: str, batches: Iterable) -> int:
+    """Write batches of grants to one CSV file; returns the number of rows written"""
+    count = 0
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(GRANT_CSV_FIELDS)
+        for batch in batches:
+            writer.writerows(_grant_rows(batch))
+            count += len(batch)
+    return count
+
+
+def _mapping_rows(permissions: List[FabricPermission]) -> Iterator[Tuple]:
+    return ((p.snowflake_role, p.role, p.email, p.grant_count, p.reasoning) for p in permissions)
+
+
+class OutputSink:
+    """Destination for exported grants and the role mapping
+    
+    Grants are written one role at a time, either whole or as a stream of
+    batches; the returned object has len() and can be iterated to read the
+    role back, so it can stand in for the grants in mapping and reporting.
+    Call close() once all roles are written, before reading them back.
+    """
+    
+    def write_role_grants(self, role: str, grants):
+        return self.write_role_batches(role, [grants])
+    
+    def write_role_batches(self, role: str, batches: Iterable):
+        raise NotImplementedError
+    
+    def read_role_grants(self, role: str) -> Iterator[SnowflakeGrant]:
+        raise NotImplementedError
+    
+    def write_mapping(self, permissions: List[FabricPermission]) -> str:
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+
+class CsvOutputSink(OutputSink):
+    """One {role}_grants.csv per role plus snowflake_fabric_role_mapping.csv"""
+    
+    def __init__(self, directory: str = '.'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    def _grants_path(self, role: str) -> str:
+        return os.path.join(self.directory, f"{role.lower()}_grants.csv")
+    
+    def write_role_batches(self, role: str, batches: Iterable) -> StreamedGrants:
+        filename = self._grants_path(role)
+        count = _write_grants_csv(filename, batches)
+        metrics.inc('rbac_sync_output_bytes_total', _file_size(filename), format='csv', kind='grants')
+        logger.info(f"📁 Saved export: {filename}")
+        return StreamedGrants(filename, count)
+    
+    def read_role_grants(self, role: str) -> Iterator[SnowflakeGrant]:
+        return iter(StreamedGrants(self._grants_path(role), 0))
+    
+    def write_mapping(self, permissions: List[FabricPermission]) -> str:
+        filename = os.path.join(self.directory, 'snowflake_fabric_role_mapping.csv')
+        with open(filename, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(MAPPING_CSV_FIELDS)
+            writer.writerows(_mapping_rows(permissions))
+        metrics.inc('rbac_sync_output_bytes_total', _file_size(filename), format='csv', kind='mapping')
+        return filename
+
+
+class ColumnarGrants:
+    """Grants for one role held in a ColumnarOutputSink dataset"""
+    
+    def __init__(self, sink: 'ColumnarOutputSink', role: str, count: int):
+        self.sink = sink
+        self.role = role
+        self.count = count
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __iter__(self) -> Iterator[SnowflakeGrant]:
+        return self.sink.read_role_grants(self.role)
+
+
+class ColumnarOutputSink(OutputSink):
+    """Every role in one compressed Parquet or Arrow IPC dataset
+    
+    Grants are buffered and written as row groups to part-NNNNN files under
+    grants/<run timestamp>/, starting a new part every max_rows_per_file
+    rows, so thousands of roles become a handful of files and earlier runs
+    are left untouched. Roles are written contiguously, which keeps the
+    per-row-group role statistics tight enough for readers to skip
+    everything but the role they filter on; this sink remembers where each
+    role starts and reads back only the row groups holding it.
+    """
+    
+    EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+    
+    def __init__(self, directory: str = '.', file_format: str = 'parquet', compression: str = 'zstd',
+                 row_group_size: int = 100000, max_rows_per_file: int = 5000000):
+        if not HAS_PYARROW:
+            raise ImportError("pyarrow is required for the parquet and arrow output formats")
+        if file_format not in self.EXTENSIONS:
+            raise ValueError(f"Unknown columnar format: {file_format}")
+        self.directory = directory
+        self.file_format = file_format
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.max_rows_per_file = max_rows_per_file
+        import pyarrow as pa
+        self.schema = pa.schema([(name, pa.string()) for name in GRANT_CSV_FIELDS])
+        self.files: List[str] = []
+        self.rows_written = 0
+        self.roles_written = 0
+        self._buffer: List[List[str]] = [[] for _ in GRANT_CSV_FIELDS]
+        self._writer = None
+        self._file_rows = 0
+        self._rows_flushed = 0
+        # Roles are contiguous: role -> (first row, row count) across all parts
+        self._role_rows: Dict[str, Tuple[int, int]] = {}
+        self._file_starts: List[int] = []
+        self._row_groups: Dict[str, Tuple[List[int], Callable]] = {}
+        self._read_lock = threading.Lock()
+        self.grants_dir = self._new_run_directory(os.path.join(directory, 'grants'))
+    
+    @staticmethod
+    def _new_run_directory(root: str) -> str:
+        """Create a fresh grants/<timestamp> directory so a run never overwrites an earlier one"""
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path, suffix = os.path.join(root, stamp), 1
+        while True:
+            try:
+                os.makedirs(path)
+                return path
+            except FileExistsError:
+                suffix += 1
+                path = os.path.join(root, f"{stamp}_{suffix}")
+    
+    def _open_writer(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        path = os.path.join(self.grants_dir, f"part-{len(self.files):05d}.{self.EXTENSIONS[self.file_format]}")
+        if self.file_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, self.schema, compression=self.compression)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            self._writer = pa.ipc.new_file(path, self.schema, options=options)
+        self.files.append(path)
+        self._file_starts.append(self._rows_flushed)
+        self._file_rows = 0
+    
+    def _flush(self):
+        if not self._buffer[0]:
+            return
+        if self._writer is None:
+            self._open_writer()
+        import pyarrow as pa
+        table = pa.Table.from_arrays([pa.array(column, pa.string()) for column in self._buffer], schema=self.schema)
+        self._writer.write_table(table)
+        self._file_rows += table.num_rows
+        self._rows_flushed += table.num_rows
+        self._buffer = [[] for _ in GRANT_CSV_FIELDS]
+        if self._file_rows >= self.max_rows_per_file:
+            self._close_writer()
+    
+    def write_role_batches(self, role: str, batches: Iterable) -> ColumnarGrants:
+        start = self.rows_written
+        count = 0
+        for batch in batches:
+            if isinstance(batch, GrantTable):
+                columns = batch.to_columns()
+                for target, name in zip(self._buffer, GRANT_CSV_FIELDS):
+                    target.extend(columns[name])
+            else:
+                for target, column in zip(self._buffer, zip(*_grant_rows(batch))):
+                    target.extend(column)
+            count += len(batch)
+            if len(self._buffer[0]) >= min(self.row_group_size, self.max_rows_per_file - self._file_rows):
+                self._flush()
+        self.rows_written += count
+        self.roles_written += 1
+        self._role_rows[role] = (start, count)
+        return ColumnarGrants(self, role, count)
+    
+    def _part_row_groups(self, path: str) -> Tuple[List[int], Callable]:
+        """Row counts of a closed part's row groups (record batches for arrow) and a reader for one"""
+        with self._read_lock:
+            if path not in self._row_groups:
+                import pyarrow as pa
+                if self.file_format == 'parquet':
+                    import pyarrow.parquet as pq
+                    part = pq.ParquetFile(path)
+                    sizes = [part.metadata.row_group(i).num_rows for i in range(part.num_row_groups)]
+                    self._row_groups[path] = (sizes, part.read_row_group)
+                else:
+                    part = pa.ipc.open_file(pa.memory_map(path))
+                    sizes = [part.get_batch(i).num_rows for i in range(part.num_record_batches)]
+                    self._row_groups[path] = (sizes, part.get_batch)
+            return self._row_groups[path]
+    
+    def read_role_grants(self, role: str) -> Iterator[SnowflakeGrant]:
+        if role not in self._role_rows:
+            return
+        start, count = self._role_rows[role]
+        end = start + count
+        file_ends = self._file_starts[1:] + [self._rows_flushed]
+        for path, file_start, file_end in zip(self.files, self._file_starts, file_ends):
+            if file_end <= start or file_start >= end:
+                continue
+            sizes, read = self._part_row_groups(path)
+            group_start = file_start
+            for index, size in enumerate(sizes):
+                group_end = group_start + size
+                if group_end > start and group_start < end:
+                    with self._read_lock:
+                        rows = read(index)
+                    first = max(start, group_start) - group_start
+                    for row in rows.slice(first, min(end, group_end) - group_start - first).to_pylist():
+                        yield SnowflakeGrant(**row)
+                group_start = group_end
+    
+    def write_mapping(self, permissions: List[FabricPermission]) -> str:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = list(zip(*_mapping_rows(permissions))) or [[] for _ in MAPPING_CSV_FIELDS]
+        table = pa.table({
+            name: pa.array(values, pa.int64() if name == 'grant_count' else pa.string())
+            for name, values in zip(MAPPING_CSV_FIELDS, columns)
+        })
+        filename = os.path.join(self.directory, f"snowflake_fabric_role_mapping.{self.EXTENSIONS[self.file_format]}")
+        if self.file_format == 'parquet':
+            pq.write_table(table, filename, compression=self.compression)
+        else:
+            with pa.ipc.new_file(filename, table.schema,
+                                 options=pa.ipc.IpcWriteOptions(compression=self.compression)) as writer:
+                writer.write_table(table)
+        metrics.inc('rbac_sync_output_bytes_total', _file_size(filename), format=self.file_format, kind='mapping')
+        return filename
+    
+    def _close_writer(self):
+        self._writer.close()
+        self._writer = None
+        metrics.inc('rbac_sync_output_bytes_total', _file_size(self.files[-1]), format=self.file_format, kind='grants')
+    
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._close_writer()
+        if self.roles_written:
+            logger.info(f"📁 Saved export: {self.grants_dir} ({self.roles_written} roles, "
+                        f"{self.rows_written} grants in {len(self.files)} {self.file_format} files)")
+
+
+def create_output_sink(output_config: Dict) -> OutputSink:
+    """Sink selected by config['output']['format']: csv (default), parquet or arrow"""
+    file_format = (output_config.get('format') or 'csv').lower()
+    directory = output_config.get('directory') or '.'
+    if file_format == 'csv':
+        return CsvOutputSink(directory)
+    return ColumnarOutputSink(
+        directory,
+        file_format=file_format,
+        compression=output_config.get('compression') or 'zstd',
+        max_rows_per_file=output_config.get('max_rows_per_file') or 5000000
+    )
+
+
+def _query_kind(sql: str) -> str:
+    """Low-cardinality metric label for a statement, e.g. 'SHOW GRANTS TO' or 'SELECT'"""
+    words = sql.split()
+    if not words:
+        return 'UNKNOWN'
+    return ' '.join(words[:3]).upper() if words[0].upper() == 'SHOW' else words[0].upper()
+
+
+class TimedCursor:
+    """Snowflake cursor proxy that records every execute() in the query latency histogram"""
+    
+    def __init__(self, cursor):
+        self._cursor = cursor
+    
+    def execute(self, sql: str, *args, **kwargs):
+        kind = _query_kind(sql)
+        try:
+            with metrics.timer('rbac_sync_snowflake_query_seconds', query=kind):
+                return self._cursor.execute(sql, *args, **kwargs)
+        except Exception:
+            metrics.inc('rbac_sync_snowflake_query_errors_total', query=kind)
+            raise
+    
+    def __iter__(self):
+        return iter(self._cursor)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
 
 
 class SnowflakeRBACExporter:
@@ -69,15 +977,19 @@ class SnowflakeRBACExporter:
         self.password = password
         self.warehouse = warehouse
         self.conn = None
+        self.failed_roles = {}
         
-    def connect(self) -> bool:
-        """Establish Snowflake connection"""
+    def connect(self, keep_alive: bool = False) -> bool:
+        """Establish Snowflake connection (keep_alive heartbeats it for long-running use)"""
         try:
+            import snowflake.connector
+            options = {'client_session_keep_alive': True} if keep_alive else {}
             self.conn = snowflake.connector.connect(
                 account=self.account,
                 user=self.user,
                 password=self.password,
-                warehouse=self.warehouse
+                warehouse=self.warehouse,
+                **options
             )
             logger.info(f"✅ Connected to Snowflake account: {self.account}")
             return True
@@ -86,161 +998,1644 @@ class SnowflakeRBACExporter:
             return False
     
     def export_role_grants(self, role_name: str) -> List[SnowflakeGrant]:
-        """Export all grants for a specific role"""
+        """Export all grants for a specific role (failures are recorded in failed_roles)"""
         if not self.conn:
             raise ConnectionError("Not connected to Snowflake")
         
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(f"SHOW GRANTS TO ROLE {role_name}")
-            
-            grants = []
-            for row in cursor.fetchall():
-                # Snowflake SHOW GRANTS returns: created_on, privilege, granted_on, name, granted_to, grantee_name, grant_option, granted_by
-                grant = SnowflakeGrant(
-                    role=role_name,
-                    privilege=row[1],
-                    granted_on=row[2],
-                    name=row[3],
-                    granted_by=row[7] if len(row) > 7 else 'UNKNOWN'
-                )
-                grants.append(grant)
+            cursor = self._cursor()
+            grants = self._fetch_role_grants(cursor, role_name)
             
             logger.info(f"✅ Exported {len(grants)} grants for role: {role_name}")
             return grants
             
         except Exception as e:
             logger.error(f"❌ Failed to export grants for {role_name}: {str(e)}")
+            self.failed_roles[role_name] = str(e)
             return []
     
-    def export_all_roles(self, roles: List[str]) -> Dict[str, List[SnowflakeGrant]]:
-        """Export grants for multiple roles"""
-        all_grants = {}
-        for role in roles:
-            all_grants[role] = self.export_role_grants(role)
-        return all_grants
+    @staticmethod
+    def _fetch_role_grants(cursor, role_name: str, timeout: Optional[int] = None) -> List[SnowflakeGrant]:
+        """Run SHOW GRANTS TO ROLE on the given cursor, raising on failure"""
+        cursor.execute(f"SHOW GRANTS TO ROLE {role_name}", timeout=timeout)
+        
+        grants = []
+        for row in cursor.fetchall():
+            # Snowflake SHOW GRANTS returns: created_on, privilege, granted_on, name, granted_to, grantee_name, grant_option, granted_by
+            grant = SnowflakeGrant(
+                role=role_name,
+                privilege=row[1],
+                granted_on=row[2],
+                name=row[3],
+                granted_by=row[7] if len(row) > 7 else 'UNKNOWN',
+                created_on=_timestamp(row[0])
+            )
+            grants.append(grant)
+        return grants
+    
+    def stream_role_grants(self, role_name: str, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[List[SnowflakeGrant]]:
+        """Yield a role's grants in batches as they come off the cursor
+        
+        SHOW commands return JSON result sets, so Arrow batch fetching is not
+        available here; fetchmany keeps only one batch in memory at a time.
+        """
+        if not self.conn:
+            raise ConnectionError("Not connected to Snowflake")
+        
+        cursor = self._cursor()
+        try:
+            cursor.execute(f"SHOW GRANTS TO ROLE {role_name}")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [
+                    SnowflakeGrant(
+                        role=role_name,
+                        privilege=row[1],
+                        granted_on=row[2],
+                        name=row[3],
+                        granted_by=row[7] if len(row) > 7 else 'UNKNOWN',
+                        created_on=_timestamp(row[0])
+                    )
+                    for row in rows
+                ]
+        finally:
+            cursor.close()
+    
+    def export_role_to_csv(self, role_name: str, filename: str,
+                           batch_size: int = STREAM_BATCH_SIZE) -> StreamedGrants:
+        """Stream a role's grants straight to a CSV file with flat memory use"""
+        count = _write_grants_csv(filename, self.stream_role_grants(role_name, batch_size))
+        
+        logger.info(f"✅ Streamed {count} grants for role: {role_name}")
+        return StreamedGrants(filename, count)
+    
+    def export_all_roles(self, roles: List[str], use_account_usage: bool = False,
+                         max_workers: int = 1, role_timeout: Optional[int] = None) -> Dict[str, List[SnowflakeGrant]]:
+        """Export grants for multiple roles"""
+        self.failed_roles = {}
+        if use_account_usage:
+            try:
+                return self.export_all_roles_bulk(roles)
+            except Exception as e:
+                logger.warning(f"⚠️  ACCOUNT_USAGE export unavailable, falling back to SHOW GRANTS: {str(e)}")
+        
+        if max_workers > 1:
+            return self.export_all_roles_parallel(roles, max_workers=max_workers, role_timeout=role_timeout)
+        
+        # Like the parallel path, failed roles are left out rather than exported as empty
+        all_grants = {}
+        for role in roles:
+            grants = self.export_role_grants(role)
+            if role not in self.failed_roles:
+                all_grants[role] = grants
+        return all_grants
+    
+    def export_all_roles_parallel(self, roles: List[str], max_workers: int = 8,
+                                  role_timeout: Optional[int] = None) -> Dict[str, List[SnowflakeGrant]]:
+        """Export grants for multiple roles concurrently over a bounded cursor pool
+        
+        Each worker borrows a cursor on the shared connection (the connector is
+        thread-safe at connection level). role_timeout is passed to Snowflake as
+        the per-query timeout in seconds. Roles that fail are left out of the
+        result and recorded in self.failed_roles with their error message.
+        """
+        if not self.conn:
+            raise ConnectionError("Not connected to Snowflake")
+        
+        self.failed_roles = {}
+        workers = max(1, min(max_workers, len(roles)))
+        cursor_pool = queue.Queue()
+        for _ in range(workers):
+            cursor_pool.put(self._cursor())
+        
+        def export_one(role_name: str) -> List[SnowflakeGrant]:
+            cursor = cursor_pool.get()
+            try:
+                return self._fetch_role_grants(cursor, role_name, timeout=role_timeout)
+            finally:
+                cursor_pool.put(cursor)
+        
+        exported = {}
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(export_one, role): role for role in roles}
+                for future in as_completed(futures):
+                    role = futures[future]
+                    try:
+                        exported[role] = future.result()
+                        logger.info(f"✅ Exported {len(exported[role])} grants for role: {role}")
+                    except Exception as e:
+                        self.failed_roles[role] = str(e)
+                        logger.error(f"❌ Failed to export grants for {role}: {str(e)}")
+        finally:
+            while not cursor_pool.empty():
+                cursor_pool.get().close()
+        
+        logger.info(f"✅ Parallel export finished: {len(exported)}/{len(roles)} roles with {workers} workers")
+        # Keep the caller's role order so downstream CSVs and reports stay stable
+        return {role: exported[role] for role in roles if role in exported}
+    
+    def export_all_roles_bulk(self, roles: List[str], batch_size: int = ACCOUNT_USAGE_BATCH_SIZE) -> Dict[str, List[SnowflakeGrant]]:
+        """Export grants for multiple roles with set-based ACCOUNT_USAGE queries
+        
+        Issues one query per batch of roles instead of one SHOW GRANTS per role.
+        Note that ACCOUNT_USAGE views lag live grants by up to two hours.
+        Raises on failure so callers can fall back to the per-role path.
+        """
+        if not self.conn:
+            raise ConnectionError("Not connected to Snowflake")
+        
+        all_grants = {role: [] for role in roles}
+        for grant in self._iter_bulk_grants(roles, batch_size):
+            all_grants.setdefault(grant.role, []).append(grant)
+        
+        total = sum(len(g) for g in all_grants.values())
+        logger.info(f"✅ Exported {total} grants for {len(roles)} roles from ACCOUNT_USAGE")
+        return all_grants
+    
+    def _iter_bulk_grants(self, roles: List[str], batch_size: int = ACCOUNT_USAGE_BATCH_SIZE) -> Iterator[SnowflakeGrant]:
+        """Yield live grants for the roles from ACCOUNT_USAGE, one batch query at a time"""
+        # GRANTEE_NAME comes back upper-case; key results by the caller's role names
+        requested = {role.upper(): role for role in roles}
+        
+        cursor = self._cursor()
+        try:
+            role_names = list(requested)
+            for start in range(0, len(role_names), batch_size):
+                batch = role_names[start:start + batch_size]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(
+                    f"SELECT GRANTEE_NAME, PRIVILEGE, GRANTED_ON, NAME, TABLE_CATALOG, TABLE_SCHEMA, GRANTED_BY, CREATED_ON "
+                    f"FROM {ACCOUNT_USAGE_GRANTS_VIEW} "
+                    f"WHERE GRANTED_TO = 'ROLE' AND DELETED_ON IS NULL "
+                    f"AND GRANTEE_NAME IN ({placeholders})",
+                    batch
+                )
+                for row in cursor:
+                    role = requested.get(row[0], row[0])
+                    yield SnowflakeGrant(
+                        role=role,
+                        privilege=row[1],
+                        granted_on=row[2],
+                        name=_qualified_name(row[2], row[4], row[5], row[3]),
+                        granted_by=row[6] or 'UNKNOWN',
+                        created_on=_timestamp(row[7])
+                    )
+        finally:
+            cursor.close()
+    
+    def export_grant_table(self, roles: List[str], use_account_usage: bool = False,
+                           max_workers: int = 1, role_timeout: Optional[int] = None) -> GrantTable:
+        """Export grants for multiple roles into one compact GrantTable"""
+        self.failed_roles = {}
+        table = GrantTable()
+        if use_account_usage:
+            try:
+                table.extend(self._iter_bulk_grants(roles))
+                logger.info(f"✅ Exported {len(table)} grants for {len(roles)} roles from ACCOUNT_USAGE")
+                return table
+            except Exception as e:
+                logger.warning(f"⚠️  ACCOUNT_USAGE export unavailable, falling back to SHOW GRANTS: {str(e)}")
+                table = GrantTable()
+        
+        if max_workers > 1:
+            for grants in self.export_all_roles_parallel(roles, max_workers, role_timeout).values():
+                table.extend(grants)
+        else:
+            for role in roles:
+                table.extend(self.export_role_grants(role))
+        return table
+    
+    def export_incremental(self, roles: List[str], snapshot_path: str, max_workers: int = 1,
+                           role_timeout: Optional[int] = None) -> Dict[str, List[SnowflakeGrant]]:
+        """Export grants by merging ACCOUNT_USAGE changes into a local snapshot
+        
+        The first run (or any role new to the snapshot) is a full export. Later
+        runs only fetch rows created, modified or deleted since each role's
+        stored watermark, re-reading an overlap window to cover ACCOUNT_USAGE
+        latency. Only the requested roles' watermarks move, so separate calls
+        for different role sets (direct then inherited roles, pipeline
+        batches, watch refreshes) each see their own changes. Without
+        ACCOUNT_USAGE access this degrades to a full export every run.
+        
+        Roles the full-export fallback cannot export are left out of the
+        result and recorded in failed_roles; their snapshot rows and
+        watermark stay as they were, so stale grants are never returned.
+        """
+        if not self.conn:
+            raise ConnectionError("Not connected to Snowflake")
+        
+        self.failed_roles = {}
+        snapshot = GrantSnapshot(snapshot_path)
+        snapshot.load()
+        refreshed = set(roles)
+        
+        try:
+            cursor = self._cursor()
+            try:
+                cursor.execute("SELECT CURRENT_TIMESTAMP()")
+                run_started = cursor.fetchone()[0]
+                
+                groups = snapshot.roles_by_watermark(roles)
+                known_roles = {role for group in groups.values() for role in group}
+                new_roles = [role for role in roles if role not in known_roles]
+                
+                for watermark, group in groups.items():
+                    changes = self._fetch_grant_changes(cursor, group, watermark)
+                    for grant, deleted in changes:
+                        snapshot.apply_change(grant, deleted)
+                    logger.info(f"✅ Merged {len(changes)} grant changes for {len(group)} roles since {watermark}")
+            finally:
+                cursor.close()
+            
+            if new_roles:
+                for role, grants in self.export_all_roles_bulk(new_roles).items():
+                    snapshot.replace_role(role, grants)
+            
+            for role in roles:
+                snapshot.watermarks[role] = _timestamp(run_started)
+        except Exception as e:
+            logger.warning(f"⚠️  Incremental export unavailable, running full export: {str(e)}")
+            # Start again from the saved snapshot: changes merged before the
+            # failure must not stick to roles the full export then misses
+            snapshot = GrantSnapshot(snapshot_path)
+            snapshot.load()
+            exported = self.export_all_roles(roles, max_workers=max_workers, role_timeout=role_timeout)
+            for role, grants in exported.items():
+                snapshot.replace_role(role, grants)
+                snapshot.watermarks.pop(role, None)
+            refreshed = set(exported)
+            if self.failed_roles:
+                logger.warning(f"⚠️  Leaving {len(self.failed_roles)} roles out of the export; their snapshot rows may be stale")
+        
+        snapshot.save()
+        logger.info(f"📁 Saved grant snapshot: {snapshot_path}")
+        return {role: snapshot.role_grants(role) for role in roles if role in refreshed and role in snapshot.grants}
+    
+    def _fetch_grant_changes(self, cursor, roles: List[str], watermark: str,
+                             batch_size: int = ACCOUNT_USAGE_BATCH_SIZE) -> List[Tuple[SnowflakeGrant, bool]]:
+        """Fetch grants added or revoked since the watermark, oldest change first"""
+        requested = {role.upper(): role for role in roles}
+        since = datetime.fromisoformat(watermark) - ACCOUNT_USAGE_LATENCY
+        
+        changes = []
+        role_names = list(requested)
+        for start in range(0, len(role_names), batch_size):
+            batch = role_names[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f"SELECT GRANTEE_NAME, PRIVILEGE, GRANTED_ON, NAME, TABLE_CATALOG, TABLE_SCHEMA, GRANTED_BY, CREATED_ON, DELETED_ON "
+                f"FROM {ACCOUNT_USAGE_GRANTS_VIEW} "
+                f"WHERE GRANTED_TO = 'ROLE' AND GRANTEE_NAME IN ({placeholders}) "
+                f"AND (CREATED_ON >= %s OR MODIFIED_ON >= %s OR DELETED_ON >= %s) "
+                f"ORDER BY COALESCE(DELETED_ON, MODIFIED_ON, CREATED_ON)",
+                batch + [since, since, since]
+            )
+            for row in cursor:
+                role = requested.get(row[0], row[0])
+                grant = SnowflakeGrant(
+                    role=role,
+                    privilege=row[1],
+                    granted_on=row[2],
+                    name=_qualified_name(row[2], row[4], row[5], row[3]),
+                    granted_by=row[6] or 'UNKNOWN',
+                    created_on=_timestamp(row[7])
+                )
+                changes.append((grant, row[8] is not None))
+        return changes
+    
+    def export_role_members(self, roles: List[str], use_account_usage: bool = False) -> Dict[str, List[str]]:
+        """Export the users directly granted each role, as emails where known
+        
+        Uses one batched ACCOUNT_USAGE query (joined to USERS for email
+        addresses, skipping disabled users) when allowed, otherwise one
+        SHOW GRANTS OF ROLE per role, which only returns user names.
+        """
+        if not self.conn:
+            raise ConnectionError("Not connected to Snowflake")
+        
+        if use_account_usage:
+            try:
+                return self._export_role_members_bulk(roles)
+            except Exception as e:
+                logger.warning(f"⚠️  ACCOUNT_USAGE member export unavailable, falling back to SHOW GRANTS OF ROLE: {str(e)}")
+        
+        members = {}
+        cursor = self._cursor()
+        try:
+            for role in roles:
+                try:
+                    cursor.execute(f"SHOW GRANTS OF ROLE {role}")
+                    # SHOW GRANTS OF ROLE returns: created_on, role, granted_to, grantee_name, granted_by
+                    members[role] = [row[3] for row in cursor.fetchall() if row[2] == 'USER']
+                except Exception as e:
+                    logger.error(f"❌ Failed to export members of {role}: {str(e)}")
+                    self.failed_roles[role] = str(e)
+        finally:
+            cursor.close()
+        
+        logger.info(f"✅ Exported {sum(len(m) for m in members.values())} role memberships for {len(members)} roles")
+        return members
+    
+    def _export_role_members_bulk(self, roles: List[str],
+                                  batch_size: int = ACCOUNT_USAGE_BATCH_SIZE) -> Dict[str, List[str]]:
+        requested = {role.upper(): role for role in roles}
+        members = {role: [] for role in roles}
+        
+        cursor = self._cursor()
+        try:
+            role_names = list(requested)
+            for start in range(0, len(role_names), batch_size):
+                batch = role_names[start:start + batch_size]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(
+                    f"SELECT g.ROLE, COALESCE(u.EMAIL, u.LOGIN_NAME, g.GRANTEE_NAME) "
+                    f"FROM {ACCOUNT_USAGE_MEMBERS_VIEW} g "
+                    f"LEFT JOIN {ACCOUNT_USAGE_USERS_VIEW} u ON u.NAME = g.GRANTEE_NAME AND u.DELETED_ON IS NULL "
+                    f"WHERE g.DELETED_ON IS NULL AND NOT COALESCE(u.DISABLED, FALSE) "
+                    f"AND g.ROLE IN ({placeholders})",
+                    batch
+                )
+                for role_name, user in cursor:
+                    members.setdefault(requested.get(role_name, role_name), []).append(user)
+        finally:
+            cursor.close()
+        
+        logger.info(f"✅ Exported {sum(len(m) for m in members.values())} role memberships from ACCOUNT_USAGE")
+        return members
+    
+    def _cursor(self) -> TimedCursor:
+        return TimedCursor(self.conn.cursor())
+    
+    def role_fingerprints(self, roles: List[str], include_members: bool = False,
+                          use_account_usage: bool = False) -> Dict[str, Optional[str]]:
+        """Cheap per-role change fingerprints, hashed server-side
+        
+        Live mode runs SHOW GRANTS TO ROLE and hashes the result with HASH_AGG
+        over RESULT_SCAN, so one value per role crosses the wire instead of
+        every grant. The ACCOUNT_USAGE mode covers all roles in one grouped
+        query per batch, but lags live grants by up to two hours. Roles that
+        no longer exist map to None.
+        """
+        if not self.conn:
+            raise ConnectionError("Not connected to Snowflake")
+        
+        if use_account_usage:
+            return self._role_fingerprints_bulk(roles, include_members)
+        
+        commands = ('SHOW GRANTS TO ROLE', 'SHOW GRANTS OF ROLE') if include_members else ('SHOW GRANTS TO ROLE',)
+        fingerprints = {}
+        cursor = self._cursor()
+        try:
+            for role in roles:
+                try:
+                    hashes = []
+                    for command in commands:
+                        cursor.execute(f"{command} {role}")
+                        cursor.execute("SELECT HASH_AGG(*) FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))")
+                        hashes.append(str(cursor.fetchone()[0]))
+                    fingerprints[role] = ':'.join(hashes)
+                except Exception as e:
+                    if '002003' not in str(e):  # Anything but "role does not exist"
+                        raise
+                    fingerprints[role] = None
+        finally:
+            cursor.close()
+        return fingerprints
+    
+    def _role_fingerprints_bulk(self, roles: List[str], include_members: bool,
+                                batch_size: int = ACCOUNT_USAGE_BATCH_SIZE) -> Dict[str, Optional[str]]:
+        """role_fingerprints from grouped ACCOUNT_USAGE queries; DELETED_ON makes revokes count"""
+        queries = [
+            f"SELECT GRANTEE_NAME, HASH_AGG(PRIVILEGE, GRANTED_ON, TABLE_CATALOG, TABLE_SCHEMA, NAME, DELETED_ON) "
+            f"FROM {ACCOUNT_USAGE_GRANTS_VIEW} WHERE GRANTED_TO = 'ROLE' AND GRANTEE_NAME IN ({{placeholders}}) "
+            f"GROUP BY GRANTEE_NAME"
+        ]
+        if include_members:
+            queries.append(
+                f"SELECT ROLE, HASH_AGG(GRANTEE_NAME, DELETED_ON) FROM {ACCOUNT_USAGE_MEMBERS_VIEW} "
+                f"WHERE ROLE IN ({{placeholders}}) GROUP BY ROLE"
+            )
+        
+        requested = {role.upper(): role for role in roles}
+        role_names = list(requested)
+        hashes = {role: ['0'] * len(queries) for role in roles}
+        cursor = self._cursor()
+        try:
+            for index, query in enumerate(queries):
+                for start in range(0, len(role_names), batch_size):
+                    batch = role_names[start:start + batch_size]
+                    cursor.execute(query.format(placeholders=', '.join(['%s'] * len(batch))), batch)
+                    for name, value in cursor.fetchall():
+                        if name in requested:
+                            hashes[requested[name]][index] = str(value)
+        finally:
+            cursor.close()
+        return {role: ':'.join(values) for role, values in hashes.items()}
+    
+    def close(self):
+        """Close Snowflake connection"""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+            logger.info("✅ Snowflake connection closed")
+
+
+class RoleGraph:
+    """Snowflake role hierarchy with memoized effective-privilege resolution
+    
+    Built from exported grants: a row with granted_on == 'ROLE' on role R means
+    R inherits every privilege of the role named in the grant. Each role's
+    transitive closure is computed once and cached; changing a role's grants
+    only invalidates that role and the roles that inherit from it.
+    """
+    
+    def __init__(self):
+        self.children: Dict[str, Set[str]] = {}
+        self.parents: Dict[str, Set[str]] = {}
+        # Values stay GrantTables when built from them, so effective grants can be
+        # assembled from code arrays without creating SnowflakeGrant objects
+        self.direct_grants: Dict[str, List[SnowflakeGrant]] = {}
+        self._closure_cache: Dict[str, FrozenSet[str]] = {}
+        self._effective_cache: Dict[str, List[SnowflakeGrant]] = {}
+    
+    @classmethod
+    def from_grants(cls, grants_by_role: Dict[str, List[SnowflakeGrant]]) -> 'RoleGraph':
+        """Build a graph from exported grants keyed by role"""
+        graph = cls()
+        for role, grants in grants_by_role.items():
+            graph.set_role_grants(role, grants)
+        return graph
+    
+    def set_role_grants(self, role: str, grants: List[SnowflakeGrant]):
+        """Replace a role's direct grants and inherited roles"""
+        for child in self.children.pop(role, set()):
+            self.parents.get(child, set()).discard(role)
+        
+        self.children[role] = set()
+        if isinstance(grants, GrantTable):
+            inherited, self.direct_grants[role] = grants.partition('ROLE')
+            for child in inherited.column_values('name'):
+                self.children[role].add(child)
+                self.parents.setdefault(child, set()).add(role)
+            self.invalidate(role)
+            return
+        
+        self.direct_grants[role] = []
+        for grant in grants:
+            if grant.granted_on == 'ROLE':
+                self.children[role].add(grant.name)
+                self.parents.setdefault(grant.name, set()).add(role)
+            else:
+                self.direct_grants[role].append(grant)
+        
+        self.invalidate(role)
+    
+    def add_grant(self, grant: SnowflakeGrant):
+        """Record a single new grant"""
+        if grant.granted_on == 'ROLE':
+            self.children.setdefault(grant.role, set()).add(grant.name)
+            self.parents.setdefault(grant.name, set()).add(grant.role)
+        else:
+            self.direct_grants.setdefault(grant.role, []).append(grant)
+        self.invalidate(grant.role)
+    
+    def remove_grant(self, grant: SnowflakeGrant):
+        """Forget a single revoked grant"""
+        if grant.granted_on == 'ROLE':
+            self.children.get(grant.role, set()).discard(grant.name)
+            self.parents.get(grant.name, set()).discard(grant.role)
+        else:
+            # A GrantTable becomes a plain list here; revocations are rare
+            self.direct_grants[grant.role] = [
+                g for g in self.direct_grants.get(grant.role, []) if g.key() != grant.key()
+            ]
+        self.invalidate(grant.role)
+    
+    def invalidate(self, role: str):
+        """Drop cached results for a role and every role that inherits from it"""
+        stack = [role]
+        while stack:
+            node = stack.pop()
+            # A parent is only ever cached after its children, so an uncached
+            # node means nothing above it is cached either
+            if self._closure_cache.pop(node, None) is None and node != role:
+                continue
+            self._effective_cache.pop(node, None)
+            stack.extend(self.parents.get(node, ()))
+    
+    def closure(self, role: str) -> FrozenSet[str]:
+        """Return the role plus every role it inherits, directly or transitively"""
+        cached = self._closure_cache.get(role)
+        if cached is not None:
+            return cached
+        
+        # Iterative post-order walk so deep hierarchies cannot hit the recursion limit
+        in_progress = set()
+        stack = [(role, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node in self._closure_cache:
+                continue
+            if expanded:
+                members = {node}
+                for child in self.children.get(node, ()):
+                    # Snowflake rejects circular grants; tolerate them here anyway
+                    members |= self._closure_cache.get(child, {child})
+                self._closure_cache[node] = frozenset(members)
+                in_progress.discard(node)
+            elif node not in in_progress:
+                in_progress.add(node)
+                stack.append((node, True))
+                for child in self.children.get(node, ()):
+                    if child not in self._closure_cache and child not in in_progress:
+                        stack.append((child, False))
+        
+        return self._closure_cache[role]
+    
+    def inherited_roles(self, role: str) -> Set[str]:
+        """Roles reachable from this role, excluding itself"""
+        return set(self.closure(role)) - {role}
+    
+    def missing_roles(self) -> Set[str]:
+        """Roles referenced by ROLE grants whose own grants are not loaded"""
+        referenced = set()
+        for children in self.children.values():
+            referenced |= children
+        return referenced - set(self.direct_grants)
+    
+    def effective_grants(self, role: str) -> List[SnowflakeGrant]:
+        """All object grants a role holds directly or through inheritance"""
+        cached = self._effective_cache.get(role)
+        if cached is not None:
+            return cached
+        
+        members = [self.direct_grants[m] for m in self.closure(role) if m in self.direct_grants]
+        if members and all(isinstance(grants, GrantTable) for grants in members):
+            effective = GrantTable.concat(members)
+        else:
+            effective = []
+            for grants in members:
+                effective.extend(grants)
+        self._effective_cache[role] = effective
+        return effective
+
+
+# Fabric workspace roles from least to most privileged
+FABRIC_ROLE_RANK = {'Viewer': 1, 'Contributor': 2, 'Member': 3, 'Admin': 4}
+# Mapping version used in cache keys when no rules file is configured
+BUILTIN_MAPPING_VERSION = 'builtin-v1'
+
+
+@dataclass
+class MappingRule:
+    """One declarative rule: any matching grant implies at least this Fabric role"""
+    privileges: List[str]
+    object_types: List[str]
+    fabric_role: str
+    reasoning: str = ''
+
+
+def role_email(role: str, entry: Optional[Dict] = None) -> Optional[str]:
+    """<ROLE>_EMAIL from the environment, falling back to a role entry's user_email"""
+    return os.getenv(f"{role.upper()}_EMAIL") or (entry or {}).get('user_email')
+
+
+class MappingDecisionTable:
+    """Declarative mapping rules compiled into a (privilege, object type) lookup
+    
+    Rules load from a JSON file such as mapping_rules.example.json. Compiling
+    keeps only the highest-ranked Fabric role for each (privilege, object
+    type) pair, with '*' as a wildcard, so mapping a role costs one dict
+    lookup per distinct pair in its grants rather than a scan of the rule
+    list per grant. Explicit per-role entries take precedence over rules.
+    
+    A rules file is the source of truth: the built-in ROLE_MAPPINGS are not
+    used, so a file can remap or drop those roles. Set include_builtin_roles
+    to true in the file to start from the built-ins, with the file's own
+    role entries overriding them.
+    """
+    
+    def __init__(self, rules: List[MappingRule], roles: Optional[Dict[str, Dict]] = None,
+                 version: Optional[str] = None, include_builtin_roles: bool = False):
+        self.rules = rules
+        self.roles = dict(roles or {})
+        if include_builtin_roles:
+            self.roles = {**FabricPermissionMapper.ROLE_MAPPINGS, **self.roles}
+        self.version = version
+        self._table: Dict[Tuple[str, str], MappingRule] = {}
+        self._resolved: Dict[Tuple[str, str], Optional[MappingRule]] = {}
+        
+        for rule in rules:
+            if rule.fabric_role not in FABRIC_ROLE_RANK:
+                raise ValueError(f"Unknown Fabric role in mapping rule: {rule.fabric_role}")
+            for privilege in rule.privileges:
+                for object_type in rule.object_types:
+                    key = (privilege.upper(), object_type.upper())
+                    current = self._table.get(key)
+                    if current is None or FABRIC_ROLE_RANK[rule.fabric_role] > FABRIC_ROLE_RANK[current.fabric_role]:
+                        self._table[key] = rule
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'MappingDecisionTable':
+        version = data.get('version') or hashlib.sha256(
+            json.dumps(data, sort_keys=True).encode()
+        ).hexdigest()[:12]
+        rules = [
+            MappingRule(
+                privileges=rule['privileges'],
+                object_types=rule.get('object_types', ['*']),
+                fabric_role=rule['fabric_role'],
+                reasoning=rule.get('reasoning', '')
+            )
+            for rule in data.get('rules', [])
+        ]
+        return cls(rules, roles=data.get('roles'), version=version,
+                   include_builtin_roles=data.get('include_builtin_roles', False))
+    
+    @classmethod
+    def from_file(cls, path: str) -> 'MappingDecisionTable':
+        with open(path) as f:
+            table = cls.from_dict(json.load(f))
+        logger.info(f"✅ Loaded {len(table.rules)} mapping rules and {len(table.roles)} role entries "
+                    f"(version {table.version}) from {path}")
+        return table
+    
+    def resolve(self, privilege: str, object_type: str) -> Optional[MappingRule]:
+        """Highest-ranked rule matching a (privilege, object type) pair"""
+        key = (privilege, object_type)
+        if key in self._resolved:
+            return self._resolved[key]
+        
+        best = None
+        for candidate in (key, (privilege, '*'), ('*', object_type), ('*', '*')):
+            rule = self._table.get(candidate)
+            if rule and (best is None or FABRIC_ROLE_RANK[rule.fabric_role] > FABRIC_ROLE_RANK[best.fabric_role]):
+                best = rule
+        self._resolved[key] = best
+        return best
+    
+    def map_role(self, snowflake_role: str, grants: List[SnowflakeGrant]) -> Optional[FabricPermission]:
+        """Map a role through explicit entries first, then the compiled rules"""
+        explicit = self.roles.get(snowflake_role)
+        if explicit:
+            return FabricPermission(
+                email=role_email(snowflake_role, explicit),
+                role=explicit['fabric_role'],
+                snowflake_role=snowflake_role,
+                grant_count=len(grants),
+                reasoning=explicit.get('reasoning', '')
+            )
+        
+        if isinstance(grants, GrantTable):
+            strings = grants.pool.strings
+            pairs = {(strings[p], strings[o]) for p, o in set(zip(grants.columns['privilege'], grants.columns['granted_on']))}
+        else:
+            pairs = {(g.privilege, g.granted_on) for g in grants}
+        
+        best = None
+        for privilege, object_type in pairs:
+            rule = self.resolve(privilege, object_type)
+            if rule and (best is None or FABRIC_ROLE_RANK[rule.fabric_role] > FABRIC_ROLE_RANK[best.fabric_role]):
+                best = rule
+        
+        if best is None:
+            return None
+        
+        return FabricPermission(
+            email=role_email(snowflake_role),
+            role=best.fabric_role,
+            snowflake_role=snowflake_role,
+            grant_count=len(grants),
+            reasoning=best.reasoning or f"Matched rule for {best.fabric_role}"
+        )
+
+
+def grant_fingerprint(role: str, grants, rules_version: str) -> str:
+    """Stable hash of a role's grant set plus everything else its mapping depends on"""
+    digest = hashlib.sha256()
+    digest.update(f"{rules_version}\n{role}\n{os.getenv(f'{role.upper()}_EMAIL', '')}\n".encode())
+    if isinstance(grants, GrantTable):
+        lines = (f"{privilege}|{granted_on}|{name}" for _, privilege, granted_on, name, _ in grants.rows())
+    else:
+        lines = (f"{g.privilege}|{g.granted_on}|{g.name}" for g in grants)
+    for line in sorted(lines):
+        digest.update(line.encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class MappingCache:
+    """Persistent SQLite cache of mapping results keyed by grant fingerprint
+    
+    Roles whose fingerprint (grant set + rules version) is unchanged since a
+    previous run reuse the stored FabricPermission and analysis instead of
+    being re-analyzed. Entries unused for the longest are evicted first.
+    """
+    
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0}
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS mapping_cache ("
+            "fingerprint TEXT PRIMARY KEY, role TEXT NOT NULL, permission TEXT, analysis TEXT, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_mapping_cache_last_used ON mapping_cache(last_used)")
+    
+    def get(self, fingerprint: str) -> Optional[Tuple[Optional[FabricPermission], Optional[Dict]]]:
+        """Cached (permission, analysis) for a fingerprint, or None on a miss"""
+        row = self.conn.execute(
+            "SELECT permission, analysis FROM mapping_cache WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        
+        self.stats['hits'] += 1
+        self.conn.execute(
+            "UPDATE mapping_cache SET last_used = ? WHERE fingerprint = ?", (time.time(), fingerprint)
+        )
+        permission = FabricPermission(**json.loads(row[0])) if row[0] else None
+        analysis = json.loads(row[1]) if row[1] else None
+        return permission, analysis
+    
+    def put(self, fingerprint: str, role: str, permission: Optional[FabricPermission], analysis: Optional[Dict]):
+        """Stage a result; written out by the next evict() or close()"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO mapping_cache (fingerprint, role, permission, analysis, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                fingerprint,
+                role,
+                json.dumps(asdict(permission)) if permission else None,
+                # NumPy scalars from batch analysis serialise via .item()
+                json.dumps(analysis, default=lambda o: o.item() if hasattr(o, 'item') else list(o)) if analysis else None,
+                time.time()
+            )
+        )
+    
+    def evict(self) -> int:
+        """Commit staged entries and drop least recently used ones beyond max_entries"""
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM mapping_cache WHERE fingerprint IN ("
+                "SELECT fingerprint FROM mapping_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        return cursor.rowcount
+    
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class FabricPermissionMapper:
+    """Maps Snowflake RBAC to Fabric workspace permissions"""
+    
+    # Mapping rules based on RBAC_MAPPING_GUIDE.md
+    ROLE_MAPPINGS = {
+        'FINANCE_ADMIN': {
+            'fabric_role': 'Admin',
+            'reasoning': 'Full CRUD access across all tables + role management',
+            'user_email': 'finance.director@company.com'
+        },
+        'FINANCE_ANALYST': {
+            'fabric_role': 'Member',
+            'reasoning': 'Broad SELECT access, needs to create reports/notebooks',
+            'user_email': 'finance.analyst@company.com'
+        },
+        'FINANCE_VIEWER': {
+            'fabric_role': 'Viewer',
+            'reasoning': 'Read-only access to dashboards, no artifact creation',
+            'user_email': 'cfo@company.com'
+        },
+        'AP_MANAGER': {
+            'fabric_role': 'Contributor',
+            'reasoning': 'INSERT/UPDATE on INVOICES and VENDORS, needs AP workflows',
+            'user_email': 'ap.manager@company.com'
+        },
+        'BUDGET_ANALYST': {
+            'fabric_role': 'Contributor',
+            'reasoning': 'INSERT/UPDATE on BUDGET_ACTUAL, needs budget planning reports',
+            'user_email': 'budget.analyst@company.com'
+        }
+    }
+    
+    @staticmethod
+    @timed('rbac_sync_mapper_seconds', operation='map_role')
+    def map_role(snowflake_role: str, grants: List[SnowflakeGrant],
+                 decision_table: Optional[MappingDecisionTable] = None) -> FabricPermission:
+        """Map a Snowflake role to Fabric permission"""
+        
+        if decision_table is not None:
+            permission = decision_table.map_role(snowflake_role, grants)
+            if permission is None:
+                logger.warning(f"⚠️  No mapping rule matched role: {snowflake_role}")
+            return permission
+        
+        if snowflake_role not in FabricPermissionMapper.ROLE_MAPPINGS:
+            logger.warning(f"⚠️  No mapping defined for role: {snowflake_role}")
+            return None
+        
+        mapping = FabricPermissionMapper.ROLE_MAPPINGS[snowflake_role]
+        
+        return FabricPermission(
+            email=role_email(snowflake_role, mapping),
+            role=mapping['fabric_role'],
+            snowflake_role=snowflake_role,
+            grant_count=len(grants),
+            reasoning=mapping['reasoning']
+        )
+    
+    @staticmethod
+    @timed('rbac_sync_mapper_seconds', operation='expand_to_users')
+    def expand_to_users(permissions: List[FabricPermission], role_members: Dict[str, List[str]],
+                        resolver: Optional['IdentityResolver'] = None) -> List[FabricPermission]:
+        """Fan role-level permissions out to each member user
+        
+        All distinct users are resolved in one resolver call; users the
+        resolver cannot find are dropped with a warning.
+        """
+        users = list(dict.fromkeys(u for p in permissions for u in role_members.get(p.snowflake_role, [])))
+        principals = resolver.resolve_batch(users) if resolver and users else {}
+        
+        expanded = []
+        for permission in permissions:
+            for user in role_members.get(permission.snowflake_role, []):
+                if resolver and not principals.get(user):
+                    logger.warning(f"⚠️  Could not resolve directory identity for {user} - skipping")
+                    continue
+                expanded.append(replace(permission, email=user, principal_id=principals.get(user)))
+        return expanded
+    
+    @staticmethod
+    def to_group_principals(permissions: List[FabricPermission],
+                            name_template: str = 'sg-fabric-{role}') -> List[FabricPermission]:
+        """One security-group assignment per role instead of one per member user"""
+        return [
+            replace(p, email=name_template.format(role=p.snowflake_role.lower()), principal_type='Group')
+            for p in permissions
+        ]
+    
+    @staticmethod
+    @timed('rbac_sync_mapper_seconds', operation='analyze_grants')
+    def analyze_grants(grants: List[SnowflakeGrant]) -> Dict:
+        """Analyze grants to understand permission scope"""
+        if isinstance(grants, GrantTable):
+            return FabricPermissionMapper._analyze_grant_table(grants)
+        
+        analysis = {
+            'total_grants': len(grants),
+            'has_delete': False,
+            'has_insert_update': False,
+            'has_select_only': False,
+            'table_privileges': {},
+            'database_usage': False,
+            'warehouse_usage': False,
+            'granted_roles': []
+        }
+        
+        for grant in grants:
+            # Check privilege types
+            if grant.privilege == 'DELETE':
+                analysis['has_delete'] = True
+            elif grant.privilege in ['INSERT', 'UPDATE']:
+                analysis['has_insert_update'] = True
+            elif grant.privilege == 'SELECT':
+                analysis['has_select_only'] = True
+            
+            # Track table-level privileges
+            if grant.granted_on == 'TABLE':
+                table_name = grant.name.split('.')[-1]  # Extract table name
+                if table_name not in analysis['table_privileges']:
+                    analysis['table_privileges'][table_name] = []
+                analysis['table_privileges'][table_name].append(grant.privilege)
+            
+            # Track inherited roles
+            if grant.granted_on == 'ROLE':
+                analysis['granted_roles'].append(grant.name)
+            
+            # Track database/warehouse usage
+            if grant.granted_on == 'DATABASE' and grant.privilege == 'USAGE':
+                analysis['database_usage'] = True
+            if grant.granted_on == 'WAREHOUSE' and grant.privilege == 'USAGE':
+                analysis['warehouse_usage'] = True
+        
+        return analysis
+    
+    @staticmethod
+    @timed('rbac_sync_mapper_seconds', operation='analyze_grants_batch')
+    def analyze_grants_batch(grants) -> 'pd.DataFrame':
+        """Analyze every role's grants in one vectorized pass (requires pandas)
+        
+        Accepts a GrantTable or a dict of role -> grants and returns one summary
+        frame indexed by role, with the same fields as analyze_grants. The
+        table_privileges column holds per-table privilege sets as sorted lists.
+        """
+        import pandas as pd
+        import numpy as np
+        
+        if isinstance(grants, dict):
+            # Effective grants keep their source role; file them under the dict key
+            tables = list(grants.values())
+            if all(isinstance(t, GrantTable) for t in tables):
+                grants = GrantTable.concat(tables, roles=list(grants))
+            else:
+                table = GrantTable()
+                for role_name, role_grants in grants.items():
+                    table.extend(role_grants, role=role_name)
+                grants = table
+        
+        pool = grants.pool
+        strings = pool.strings
+        dtype = np.dtype(f"u{grants.columns['role'].itemsize}")
+        role, privilege, granted_on, name = (
+            np.frombuffer(grants.columns[column], dtype=dtype).astype(np.int64)
+            for column in ('role', 'privilege', 'granted_on', 'name')
+        )
+        
+        def codes(*values):
+            return [code for code in (pool.code(v) for v in values) if code is not None]
+        
+        is_table = np.isin(granted_on, codes('TABLE'))
+        is_role = np.isin(granted_on, codes('ROLE'))
+        is_usage = np.isin(privilege, codes('USAGE'))
+        flags = pd.DataFrame({
+            'role': role,
+            'total_grants': 1,
+            'has_delete': np.isin(privilege, codes('DELETE')),
+            'has_insert_update': np.isin(privilege, codes('INSERT', 'UPDATE')),
+            'has_select_only': np.isin(privilege, codes('SELECT')),
+            'database_usage': np.isin(granted_on, codes('DATABASE')) & is_usage,
+            'warehouse_usage': np.isin(granted_on, codes('WAREHOUSE')) & is_usage
+        })
+        summary = flags.groupby('role').agg({
+            'total_grants': 'sum',
+            'has_delete': 'any',
+            'has_insert_update': 'any',
+            'has_select_only': 'any',
+            'database_usage': 'any',
+            'warehouse_usage': 'any'
+        })
+        
+        # Decode through an object array; split dotted names once per distinct object
+        string_array = np.array(strings, dtype=object)
+        table_codes = np.unique(name[is_table])
+        short_names = pd.Series([strings[c].split('.')[-1] for c in table_codes], index=table_codes)
+        table_rows = pd.DataFrame({
+            'role': role[is_table],
+            'table': short_names.reindex(name[is_table]).to_numpy(),
+            'privilege': string_array[privilege[is_table]]
+        }).drop_duplicates().sort_values(['role', 'table', 'privilege'])
+        
+        # Nesting the de-duplicated rows is cheaper than per-group pandas aggregation
+        table_privileges: Dict[int, Dict[str, List[str]]] = {}
+        for role_code, table_name, privilege_name in zip(*(table_rows[c].to_numpy() for c in table_rows.columns)):
+            table_privileges.setdefault(role_code, {}).setdefault(table_name, []).append(privilege_name)
+        
+        granted_roles: Dict[int, List[str]] = {}
+        for role_code, role_name in zip(role[is_role], string_array[name[is_role]]):
+            granted_roles.setdefault(role_code, []).append(role_name)
+        
+        summary['table_privileges'] = [table_privileges.get(code, {}) for code in summary.index]
+        summary['table_count'] = summary['table_privileges'].map(len)
+        summary['granted_roles'] = [granted_roles.get(code, []) for code in summary.index]
+        summary.index = pd.Index([strings[code] for code in summary.index], name='role')
+        return summary
+    
+    @staticmethod
+    def _analyze_grant_table(table: GrantTable) -> Dict:
+        """analyze_grants over interned codes, without building SnowflakeGrant objects"""
+        strings = table.pool.strings
+        privileges = {strings[code] for code in set(table.columns['privilege'])}
+        
+        analysis = {
+            'total_grants': len(table),
+            'has_delete': 'DELETE' in privileges,
+            'has_insert_update': bool(privileges & {'INSERT', 'UPDATE'}),
+            'has_select_only': 'SELECT' in privileges,
+            'table_privileges': {},
+            'database_usage': False,
+            'warehouse_usage': False,
+            'granted_roles': []
+        }
+        
+        table_names = {}
+        columns = table.columns
+        for privilege, granted_on, name in zip(columns['privilege'], columns['granted_on'], columns['name']):
+            object_type = strings[granted_on]
+            if object_type == 'TABLE':
+                table_name = table_names.get(name)
+                if table_name is None:
+                    table_name = table_names[name] = strings[name].split('.')[-1]
+                analysis['table_privileges'].setdefault(table_name, []).append(strings[privilege])
+            elif object_type == 'ROLE':
+                analysis['granted_roles'].append(strings[name])
+            elif object_type == 'DATABASE' and strings[privilege] == 'USAGE':
+                analysis['database_usage'] = True
+            elif object_type == 'WAREHOUSE' and strings[privilege] == 'USAGE':
+                analysis['warehouse_usage'] = True
+        
+        return analysis
+
+
+# (connect, read) timeouts in seconds for Fabric / Entra HTTP calls
+DEFAULT_HTTP_TIMEOUT = (5.0, 30.0)
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+FABRIC_API_BASE_URL = 'https://api.powerbi.com/v1.0/myorg'
+LOGIN_BASE_URL = 'https://login.microsoftonline.com'
+FABRIC_API_SCOPE = 'https://analysis.windows.net/powerbi/api/.default'
+GRAPH_API_SCOPE = 'https://graph.microsoft.com/.default'
+TOKEN_REFRESH_MARGIN = 300
+WORKSPACE_USERS_PAGE_SIZE = 1000
+
+
+def create_http_session(max_retries: int = 5, backoff_factor: float = 0.5,
+                        pool_size: int = 20,
+                        retry_methods: FrozenSet[str] = frozenset({'GET', 'POST', 'PUT', 'DELETE'})) -> 'requests.Session':
+    """Pooled keep-alive HTTP session that retries 5xx responses and dropped connections
+    
+    Retries back off exponentially (backoff_factor * 2^n seconds). Workspace
+    user writes are retried too: re-sending an assignment is harmless, and
+    the Fabric API reports an existing user rather than duplicating it.
+    Pass retry_methods without POST for calls that are not idempotent.
+    HTTP 429 is deliberately left to the caller's rate limiter.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(retry_methods),
+        # urllib3 would otherwise retry any 429 carrying Retry-After itself
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.hooks['response'].append(_record_http_metrics)
+    return session
+
+
+def _record_http_metrics(response, *args, **kwargs):
+    """requests response hook: per-call latency and status, transport retries and 429s"""
+    request = response.request
+    host = urlparse(request.url).hostname or 'unknown'
+    metrics.observe('rbac_sync_http_request_seconds', response.elapsed.total_seconds(),
+                    host=host, method=request.method, status=str(response.status_code))
+    retries = getattr(getattr(response.raw, 'retries', None), 'history', None)
+    if retries:
+        metrics.inc('rbac_sync_http_retries_total', len(retries), host=host, method=request.method)
+    if response.status_code == 429:
+        metrics.inc('rbac_sync_http_throttled_total', host=host)
+
+
+# Serializes token cache read-merge-write between providers in this process;
+# an flock on <cache>.lock does the same between processes where available
+_token_cache_lock = threading.Lock()
+
+
+@contextmanager
+def _token_cache_locked(cache_path: str):
+    with _token_cache_lock:
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        fd = os.open(f"{cache_path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+
+class TokenProvider:
+    """Client-credentials token cache with proactive refresh
+    
+    token() returns the cached access token until it is within refresh_margin
+    seconds of expiry, then fetches a new one. A lock makes concurrent callers
+    (threads, or async tasks running calls on worker threads) share one
+    request. With cache_path set, tokens are also kept in a 0600 JSON file so
+    other processes reuse them (writes are serialized through <cache>.lock);
+    the client secret is never written.
+    """
+    
+    def __init__(self, tenant_id: str, client_id: str, client_secret: str, scope: str,
+                 cache_path: Optional[str] = None, refresh_margin: int = TOKEN_REFRESH_MARGIN,
+                 session: Optional['requests.Session'] = None, timeout: Tuple[float, float] = DEFAULT_HTTP_TIMEOUT,
+                 login_base_url: str = LOGIN_BASE_URL):
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.scope = scope
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+        self.session = session or create_http_session(max_retries=3)
+        self.timeout = timeout
+        self.login_base_url = login_base_url.rstrip('/')
+        self.access_token = None
+        self.expires_at = 0.0
+        self.requests_made = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def cache_key(self) -> str:
+        return f"{self.tenant_id}|{self.client_id}|{self.scope}"
+    
+    def _fresh(self) -> bool:
+        return bool(self.access_token) and time.time() < self.expires_at - self.refresh_margin
+    
+    def token(self) -> str:
+        """Valid access token, refreshed shortly before it expires"""
+        if self._fresh():
+            return self.access_token
+        with self._lock:
+            if self._fresh():
+                return self.access_token
+            if self._load_cached() and self._fresh():
+                return self.access_token
+            self._fetch()
+            return self.access_token
+    
+    def invalidate(self):
+        """Drop the cached token, e.g. after the API rejected it with 401"""
+        with self._lock:
+            self.access_token = None
+            self.expires_at = 0.0
+            self._save_cached()
+    
+    def _fetch(self):
+        response = self.session.post(
+            f"{self.login_base_url}/{self.tenant_id}/oauth2/v2.0/token",
+            data={
+                'grant_type': 'client_credentials',
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'scope': self.scope
+            },
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        body = response.json()
+        self.requests_made += 1
+        self.access_token = body['access_token']
+        self.expires_at = time.time() + int(body.get('expires_in', 3600))
+        self._save_cached()
+    
+    def _load_cached(self) -> bool:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path, 'r') as f:
+                entry = json.load(f).get(self.cache_key)
+        except (OSError, ValueError):
+            return False
+        if not entry:
+            return False
+        self.access_token = entry['access_token']
+        self.expires_at = entry['expires_at']
+        return True
+    
+    def _save_cached(self):
+        """Merge this provider's token into the cache file; failures are logged, not raised"""
+        if not self.cache_path:
+            return
+        try:
+            with _token_cache_locked(self.cache_path):
+                entries = {}
+                if os.path.exists(self.cache_path):
+                    try:
+                        with open(self.cache_path, 'r') as f:
+                            entries = json.load(f)
+                    except (OSError, ValueError):
+                        entries = {}
+                if self.access_token:
+                    entries[self.cache_key] = {'access_token': self.access_token, 'expires_at': self.expires_at}
+                else:
+                    entries.pop(self.cache_key, None)
+                
+                # mkstemp creates a fresh 0600 file with a unique name, so writers never share it
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(os.path.abspath(self.cache_path)),
+                    prefix=f".{os.path.basename(self.cache_path)}.", suffix='.tmp'
+                )
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump(entries, f)
+                    os.replace(tmp_path, self.cache_path)
+                except BaseException:
+                    try:
+                        os.unlink(tmp_path)
+                    except OSError:
+                        pass
+                    raise
+        except OSError as e:
+            logger.warning(f"⚠️  Could not write token cache {self.cache_path}: {str(e)}")
+
+
+_token_providers: Dict[Tuple[str, str, str, str], TokenProvider] = {}
+_token_providers_lock = threading.Lock()
+
+
+def get_token_provider(tenant_id: str, client_id: str, client_secret: str, scope: str,
+                       cache_path: Optional[str] = None, login_base_url: str = LOGIN_BASE_URL) -> TokenProvider:
+    """Process-wide TokenProvider for a (tenant, client, scope), created on first use"""
+    key = (login_base_url, tenant_id, client_id, scope)
+    with _token_providers_lock:
+        provider = _token_providers.get(key)
+        if provider is None:
+            provider = TokenProvider(tenant_id, client_id, client_secret, scope, cache_path=cache_path,
+                                     login_base_url=login_base_url)
+            _token_providers[key] = provider
+        return provider
+
+
+class IdentityResolver:
+    """Resolves user identifiers (emails / UPNs) to directory principal IDs
+    
+    Subclasses implement resolve_batch; unknown identifiers map to None.
+    Identifiers that could not be looked up (throttling, server errors) are
+    left out of the result, so callers and caches can tell them apart.
+    """
+    
+    def resolve_batch(self, identifiers: List[str]) -> Dict[str, Optional[str]]:
+        raise NotImplementedError
+
+
+class StaticIdentityResolver(IdentityResolver):
+    """Resolves from a fixed mapping - a local stand-in for the directory"""
+    
+    def __init__(self, principals: Dict[str, str]):
+        self.principals = {k.lower(): v for k, v in principals.items()}
+        self.lookups = 0
+    
+    @classmethod
+    def from_file(cls, path: str) -> 'StaticIdentityResolver':
+        with open(path) as f:
+            return cls(json.load(f))
+    
+    def resolve_batch(self, identifiers: List[str]) -> Dict[str, Optional[str]]:
+        self.lookups += 1
+        return {identifier: self.principals.get(identifier.lower()) for identifier in identifiers}
+
+
+class GraphIdentityResolver(IdentityResolver):
+    """Resolves users through Microsoft Graph JSON batching (20 lookups per request)"""
+    
+    GRAPH_BATCH_URL = 'https://graph.microsoft.com/v1.0/$batch'
+    GRAPH_BATCH_LIMIT = 20
+    # Per-item statuses inside a $batch response that are worth retrying
+    RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+    
+    def __init__(self, tenant_id: str, client_id: str, client_secret: str,
+                 session: Optional['requests.Session'] = None, timeout: Tuple[float, float] = DEFAULT_HTTP_TIMEOUT,
+                 token_provider: Optional[TokenProvider] = None, max_retries: int = 3):
+        self.token_provider = token_provider or get_token_provider(
+            tenant_id, client_id, client_secret, GRAPH_API_SCOPE
+        )
+        self.session = session or create_http_session()
+        self.timeout = timeout
+        self.max_retries = max_retries
+    
+    def resolve_batch(self, identifiers: List[str]) -> Dict[str, Optional[str]]:
+        """Look up users 20 per $batch request
+        
+        Found users map to their object ID and 404s to None. Items throttled
+        or failed inside the batch are retried after the longest Retry-After
+        they carry; any still failing are left out of the result.
+        """
+        resolved = {}
+        pending = list(identifiers)
+        for attempt in range(self.max_retries + 1):
+            retry = []
+            delay = 0.0
+            headers = {'Authorization': f'Bearer {self.token_provider.token()}', 'Content-Type': 'application/json'}
+            for start in range(0, len(pending), self.GRAPH_BATCH_LIMIT):
+                chunk = pending[start:start + self.GRAPH_BATCH_LIMIT]
+                payload = {'requests': [
+                    {'id': str(i), 'method': 'GET', 'url': f"/users/{quote(identifier)}?$select=id"}
+                    for i, identifier in enumerate(chunk)
+                ]}
+                response = self.session.post(self.GRAPH_BATCH_URL, headers=headers, json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                for item in response.json().get('responses', []):
+                    identifier = chunk[int(item['id'])]
+                    status = item.get('status')
+                    if status == 200:
+                        resolved[identifier] = item['body'].get('id')
+                    elif status == 404:
+                        resolved[identifier] = None
+                    elif status in self.RETRYABLE_STATUSES:
+                        retry.append(identifier)
+                        delay = max(delay, _retry_after_seconds(item.get('headers'), default=2 ** attempt))
+                    else:
+                        logger.warning(f"⚠️  Directory lookup for {identifier} failed with HTTP {status}")
+            
+            if not retry:
+                break
+            if attempt < self.max_retries:
+                logger.warning(f"⏳ {len(retry)} directory lookups throttled or failed - retrying in {delay:.1f}s")
+                time.sleep(delay)
+            else:
+                logger.warning(f"⚠️  {len(retry)} directory lookups still failing - leaving them unresolved")
+            pending = retry
+        return resolved
+
+
+class CachingIdentityResolver(IdentityResolver):
+    """TTL cache in front of another resolver, optionally persisted to JSON
+    
+    Only identifiers that are missing or expired are sent to the wrapped
+    resolver, in a single resolve_batch call. Negative results (users the
+    directory reported as not found) are cached too so unknown users are not
+    looked up on every run; lookups that failed are not cached at all.
+    """
+    
+    def __init__(self, resolver: IdentityResolver, ttl_seconds: int = 86400, cache_path: Optional[str] = None):
+        self.resolver = resolver
+        self.ttl_seconds = ttl_seconds
+        self.cache_path = cache_path
+        self.stats = {'hits': 0, 'misses': 0}
+        self._cache: Dict[str, Tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                self._cache = {k: tuple(v) for k, v in json.load(f).items()}
+    
+    def resolve_batch(self, identifiers: List[str]) -> Dict[str, Optional[str]]:
+        now = time.time()
+        resolved = {}
+        missing = []
+        with self._lock:
+            for identifier in dict.fromkeys(identifiers):
+                entry = self._cache.get(identifier.lower())
+                if entry and entry[1] > now:
+                    resolved[identifier] = entry[0]
+                    self.stats['hits'] += 1
+                else:
+                    missing.append(identifier)
+                    self.stats['misses'] += 1
+        
+        if missing:
+            fetched = self.resolver.resolve_batch(missing)
+            with self._lock:
+                for identifier in missing:
+                    principal_id = fetched.get(identifier)
+                    if identifier in fetched:
+                        self._cache[identifier.lower()] = (principal_id, now + self.ttl_seconds)
+                    resolved[identifier] = principal_id
+                if self.cache_path:
+                    self._save()
+        return resolved
+    
+    def _save(self):
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+
+class GroupDirectory:
+    """Directory security groups that stand in for Snowflake roles
+    
+    In group principal mode each role is assigned to a workspace once, as a
+    group, and role membership is synced into the group instead. Subclasses
+    implement the four primitives; sync_members diffs and applies in bulk.
+    """
+    
+    def ensure_group(self, name: str, create: bool = True) -> Optional[str]:
+        raise NotImplementedError
+    
+    def list_members(self, group_id: str) -> Set[str]:
+        raise NotImplementedError
+    
+    def add_members(self, group_id: str, member_ids: List[str]):
+        raise NotImplementedError
+    
+    def remove_members(self, group_id: str, member_ids: List[str]):
+        raise NotImplementedError
+    
+    def sync_members(self, group_id: str, member_ids: List[str], allow_removals: bool = False,
+                     dry_run: bool = False) -> Dict[str, int]:
+        """Make the group's membership match member_ids; removals are opt-in"""
+        current = self.list_members(group_id)
+        wanted = set(member_ids)
+        to_add = sorted(wanted - current)
+        to_remove = sorted(current - wanted) if allow_removals else []
+        if to_add and not dry_run:
+            self.add_members(group_id, to_add)
+        if to_remove and not dry_run:
+            self.remove_members(group_id, to_remove)
+        return {'added': len(to_add), 'removed': len(to_remove), 'unchanged': len(wanted & current)}
+
+
+class InMemoryGroupDirectory(GroupDirectory):
+    """Groups held in memory - a local stand-in for the directory in tests and dry runs"""
+    
+    def __init__(self, groups: Optional[Dict[str, Set[str]]] = None):
+        self.names = {}
+        self.members = {}
+        self.calls = 0
+        for name, member_ids in (groups or {}).items():
+            group_id = self.ensure_group(name)
+            self.members[group_id] = set(member_ids)
+        self.calls = 0
     
-    def close(self):
-        """Close Snowflake connection"""
-        if self.conn:
-            self.conn.close()
-            logger.info("✅ Snowflake connection closed")
+    def ensure_group(self, name: str, create: bool = True) -> Optional[str]:
+        self.calls += 1
+        if name not in self.names and create:
+            self.names[name] = f"group-{len(self.names) + 1:04d}"
+            self.members[self.names[name]] = set()
+        return self.names.get(name)
+    
+    def list_members(self, group_id: str) -> Set[str]:
+        self.calls += 1
+        return set(self.members.get(group_id, set()))
+    
+    def add_members(self, group_id: str, member_ids: List[str]):
+        self.calls += 1
+        self.members.setdefault(group_id, set()).update(member_ids)
+    
+    def remove_members(self, group_id: str, member_ids: List[str]):
+        self.calls += 1
+        self.members.get(group_id, set()).difference_update(member_ids)
 
 
-class FabricPermissionMapper:
-    """Maps Snowflake RBAC to Fabric workspace permissions"""
+class GraphGroupDirectory(GroupDirectory):
+    """Security groups in Entra ID via Microsoft Graph
     
-    # Mapping rules based on RBAC_MAPPING_GUIDE.md
-    ROLE_MAPPINGS = {
-        'FINANCE_ADMIN': {
-            'fabric_role': 'Admin',
-            'reasoning': 'Full CRUD access across all tables + role management',
-            'user_email': 'finance.director@company.com'
-        },
-        'FINANCE_ANALYST': {
-            'fabric_role': 'Member',
-            'reasoning': 'Broad SELECT access, needs to create reports/notebooks',
-            'user_email': 'finance.analyst@company.com'
-        },
-        'FINANCE_VIEWER': {
-            'fabric_role': 'Viewer',
-            'reasoning': 'Read-only access to dashboards, no artifact creation',
-            'user_email': 'cfo@company.com'
-        },
-        'AP_MANAGER': {
-            'fabric_role': 'Contributor',
-            'reasoning': 'INSERT/UPDATE on INVOICES and VENDORS, needs AP workflows',
-            'user_email': 'ap.manager@company.com'
-        },
-        'BUDGET_ANALYST': {
-            'fabric_role': 'Contributor',
-            'reasoning': 'INSERT/UPDATE on BUDGET_ACTUAL, needs budget planning reports',
-            'user_email': 'budget.analyst@company.com'
-        }
-    }
+    Members are added 20 per PATCH (members@odata.bind) and removed 20 per
+    $batch request, so membership sync costs O(users / 20) calls.
     
-    @staticmethod
-    def map_role(snowflake_role: str, grants: List[SnowflakeGrant]) -> FabricPermission:
-        """Map a Snowflake role to Fabric permission"""
-        
-        if snowflake_role not in FabricPermissionMapper.ROLE_MAPPINGS:
-            logger.warning(f"⚠️  No mapping defined for role: {snowflake_role}")
-            return None
-        
-        mapping = FabricPermissionMapper.ROLE_MAPPINGS[snowflake_role]
-        
-        return FabricPermission(
-            email=mapping['user_email'],
-            role=mapping['fabric_role'],
-            snowflake_role=snowflake_role,
-            grant_count=len(grants),
-            reasoning=mapping['reasoning']
+    Creating a group is not idempotent, so it goes through a session that
+    never re-sends POSTs; a failed create is retried only after searching
+    for the group again, in case the first attempt did go through. Like the
+    add path, removals raise if any item in a $batch response failed.
+    """
+    
+    GRAPH_URL = 'https://graph.microsoft.com/v1.0'
+    GRAPH_BATCH_LIMIT = 20
+    GROUP_CREATE_ATTEMPTS = 3
+    
+    def __init__(self, tenant_id: str, client_id: str, client_secret: str,
+                 session: Optional['requests.Session'] = None, timeout: Tuple[float, float] = DEFAULT_HTTP_TIMEOUT,
+                 token_provider: Optional[TokenProvider] = None):
+        self.token_provider = token_provider or get_token_provider(
+            tenant_id, client_id, client_secret, GRAPH_API_SCOPE
         )
+        self.session = session or create_http_session()
+        # Always a dedicated session: a caller's session may well re-send POSTs
+        self.create_session = create_http_session(retry_methods=frozenset({'GET'}))
+        self.timeout = timeout
     
-    @staticmethod
-    def analyze_grants(grants: List[SnowflakeGrant]) -> Dict:
-        """Analyze grants to understand permission scope"""
-        analysis = {
-            'total_grants': len(grants),
-            'has_delete': False,
-            'has_insert_update': False,
-            'has_select_only': False,
-            'table_privileges': {},
-            'database_usage': False,
-            'warehouse_usage': False
-        }
-        
-        for grant in grants:
-            # Check privilege types
-            if grant.privilege == 'DELETE':
-                analysis['has_delete'] = True
-            elif grant.privilege in ['INSERT', 'UPDATE']:
-                analysis['has_insert_update'] = True
-            elif grant.privilege == 'SELECT':
-                analysis['has_select_only'] = True
-            
-            # Track table-level privileges
-            if grant.granted_on == 'TABLE':
-                table_name = grant.name.split('.')[-1]  # Extract table name
-                if table_name not in analysis['table_privileges']:
-                    analysis['table_privileges'][table_name] = []
-                analysis['table_privileges'][table_name].append(grant.privilege)
+    def _headers(self) -> Dict[str, str]:
+        return {'Authorization': f'Bearer {self.token_provider.token()}', 'Content-Type': 'application/json'}
+    
+    def _find_group(self, name: str) -> Optional[str]:
+        escaped = name.replace("'", "''")
+        response = self.session.get(
+            f"{self.GRAPH_URL}/groups",
+            headers=self._headers(),
+            params={'$filter': f"displayName eq '{escaped}'", '$select': 'id'},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        found = response.json().get('value', [])
+        return found[0]['id'] if found else None
+    
+    def ensure_group(self, name: str, create: bool = True) -> Optional[str]:
+        for attempt in range(self.GROUP_CREATE_ATTEMPTS):
+            group_id = self._find_group(name)
+            if group_id or not create:
+                return group_id
             
-            # Track database/warehouse usage
-            if grant.granted_on == 'DATABASE' and grant.privilege == 'USAGE':
-                analysis['database_usage'] = True
-            if grant.granted_on == 'WAREHOUSE' and grant.privilege == 'USAGE':
-                analysis['warehouse_usage'] = True
-        
-        return analysis
+            try:
+                response = self.create_session.post(f"{self.GRAPH_URL}/groups", headers=self._headers(), json={
+                    'displayName': name,
+                    'mailEnabled': False,
+                    'mailNickname': ''.join(c for c in name if c.isalnum() or c in '-_')[:64],
+                    'securityEnabled': True
+                }, timeout=self.timeout)
+            except OSError as e:
+                # requests' connection and timeout errors are OSErrors; the create may have landed
+                if attempt + 1 == self.GROUP_CREATE_ATTEMPTS:
+                    raise
+                logger.warning(f"⚠️  Creating group {name} failed ({str(e)}) - checking before retrying")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt + 1 == self.GROUP_CREATE_ATTEMPTS:
+                    response.raise_for_status()
+                    logger.info(f"✅ Created security group {name}")
+                    return response.json()['id']
+                logger.warning(f"⚠️  Creating group {name} returned HTTP {response.status_code} - checking before retrying")
+            time.sleep(2 ** attempt)
+        return None
+    
+    def list_members(self, group_id: str) -> Set[str]:
+        members = set()
+        url = f"{self.GRAPH_URL}/groups/{group_id}/members/microsoft.graph.user"
+        params = {'$select': 'id', '$top': 999}
+        while url:
+            response = self.session.get(url, headers=self._headers(), params=params, timeout=self.timeout)
+            response.raise_for_status()
+            body = response.json()
+            members.update(member['id'] for member in body.get('value', []))
+            url, params = body.get('@odata.nextLink'), None
+        return members
+    
+    def add_members(self, group_id: str, member_ids: List[str]):
+        for start in range(0, len(member_ids), self.GRAPH_BATCH_LIMIT):
+            chunk = member_ids[start:start + self.GRAPH_BATCH_LIMIT]
+            response = self.session.patch(
+                f"{self.GRAPH_URL}/groups/{group_id}",
+                headers=self._headers(),
+                json={'members@odata.bind': [f"{self.GRAPH_URL}/directoryObjects/{mid}" for mid in chunk]},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+    
+    def remove_members(self, group_id: str, member_ids: List[str]):
+        failed = []
+        for start in range(0, len(member_ids), self.GRAPH_BATCH_LIMIT):
+            chunk = member_ids[start:start + self.GRAPH_BATCH_LIMIT]
+            payload = {'requests': [
+                {'id': str(i), 'method': 'DELETE', 'url': f"/groups/{group_id}/members/{mid}/$ref"}
+                for i, mid in enumerate(chunk)
+            ]}
+            response = self.session.post(f"{self.GRAPH_URL}/$batch", headers=self._headers(),
+                                         json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            # 404 means the user is already not a member
+            failed.extend(
+                f"{chunk[int(item['id'])]} (HTTP {item.get('status')})"
+                for item in response.json().get('responses', [])
+                if item.get('status') not in (200, 204, 404)
+            )
+        if failed:
+            raise RuntimeError(f"Failed to remove {len(failed)} members from group {group_id}: {', '.join(failed)}")
+
+
+@dataclass
+class ReconciliationPlan:
+    """Workspace changes needed to reach the desired membership"""
+    adds: List[FabricPermission] = field(default_factory=list)
+    updates: List[FabricPermission] = field(default_factory=list)
+    removes: List[Dict] = field(default_factory=list)
+    unchanged: int = 0
+    
+    def summary(self) -> Dict[str, int]:
+        return {
+            'add': len(self.adds),
+            'update': len(self.updates),
+            'remove': len(self.removes),
+            'unchanged': self.unchanged
+        }
 
 
 class FabricWorkspaceSync:
     """Syncs permissions to Microsoft Fabric workspace via REST API"""
     
-    def __init__(self, workspace_id: str, tenant_id: str, client_id: str, client_secret: str):
+    def __init__(self, workspace_id: str, tenant_id: str, client_id: str, client_secret: str,
+                 timeout: Tuple[float, float] = DEFAULT_HTTP_TIMEOUT, max_retries: int = 5,
+                 backoff_factor: float = 0.5, pool_size: int = 20,
+                 session: Optional['requests.Session'] = None,
+                 token_provider: Optional[TokenProvider] = None,
+                 api_base_url: str = FABRIC_API_BASE_URL):
         self.workspace_id = workspace_id
         self.tenant_id = tenant_id
         self.client_id = client_id
         self.client_secret = client_secret
         self.access_token = None
+        self.timeout = timeout
+        self.api_base_url = api_base_url.rstrip('/')
+        # One pooled session per syncer so connections (and TLS sessions) are reused
+        self.session = session or create_http_session(max_retries, backoff_factor, pool_size)
+        # Tokens are shared across syncers for the same app registration
+        self.token_provider = token_provider or get_token_provider(
+            tenant_id, client_id, client_secret, FABRIC_API_SCOPE
+        )
+    
+    def close(self):
+        """Release pooled HTTP connections"""
+        self.session.close()
     
     def authenticate(self) -> bool:
         """Get Azure AD access token for Fabric API"""
         try:
-            token_url = f"https://login.microsoftonline.com/{self.tenant_id}/oauth2/v2.0/token"
-            
-            payload = {
-                'grant_type': 'client_credentials',
-                'client_id': self.client_id,
-                'client_secret': self.client_secret,
-                'scope': 'https://analysis.windows.net/powerbi/api/.default'
-            }
-            
-            response = requests.post(token_url, data=payload)
-            response.raise_for_status()
-            
-            self.access_token = response.json()['access_token']
+            self.access_token = self.token_provider.token()
             logger.info("✅ Successfully authenticated with Fabric API")
             return True
             
@@ -260,20 +2655,7 @@ class FabricWorkspaceSync:
             return False
         
         try:
-            url = f"https://api.powerbi.com/v1.0/myorg/groups/{self.workspace_id}/users"
-            
-            headers = {
-                'Authorization': f'Bearer {self.access_token}',
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                'identifier': permission.email,
-                'groupUserAccessRight': permission.role,
-                'principalType': 'User'
-            }
-            
-            response = requests.post(url, headers=headers, json=payload)
+            response = self.request_workspace_user('add', permission)
             
             if response.status_code == 200:
                 logger.info(f"✅ Assigned {permission.email} as {permission.role} in workspace")
@@ -286,6 +2668,95 @@ class FabricWorkspaceSync:
             logger.error(f"❌ Error adding workspace user: {str(e)}")
             return False
     
+    def update_workspace_user(self, permission: FabricPermission, dry_run: bool = False) -> bool:
+        """Change an existing user's workspace role"""
+        
+        if dry_run:
+            logger.info(f"🔍 [DRY RUN] Would update: {permission.email} → {permission.role}")
+            return True
+        
+        if not self.access_token:
+            logger.error("❌ Not authenticated. Call authenticate() first.")
+            return False
+        
+        try:
+            response = self.request_workspace_user('update', permission)
+            
+            if response.status_code == 200:
+                logger.info(f"✅ Updated {permission.email} to {permission.role} in workspace")
+                return True
+            else:
+                logger.error(f"❌ Failed to update permission: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            logger.error(f"❌ Error updating workspace user: {str(e)}")
+            return False
+    
+    def remove_workspace_user(self, identifier: str, dry_run: bool = False) -> bool:
+        """Remove a user from the workspace"""
+        
+        if dry_run:
+            logger.info(f"🔍 [DRY RUN] Would remove: {identifier}")
+            return True
+        
+        if not self.access_token:
+            logger.error("❌ Not authenticated. Call authenticate() first.")
+            return False
+        
+        try:
+            response = self.request_workspace_user(
+                'remove', FabricPermission(email=identifier, role='', snowflake_role='', grant_count=0, reasoning='')
+            )
+            
+            if response.status_code == 200:
+                logger.info(f"✅ Removed {identifier} from workspace")
+                return True
+            else:
+                logger.error(f"❌ Failed to remove user: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            logger.error(f"❌ Error removing workspace user: {str(e)}")
+            return False
+    
+    def _users_url(self) -> str:
+        return f"{self.api_base_url}/groups/{self.workspace_id}/users"
+    
+    def _auth_headers(self) -> Dict[str, str]:
+        """Bearer headers with a token that is refreshed before it expires"""
+        self.access_token = self.token_provider.token()
+        return {
+            'Authorization': f'Bearer {self.access_token}',
+            'Content-Type': 'application/json'
+        }
+    
+    def request_workspace_user(self, action: str, permission: FabricPermission) -> 'requests.Response':
+        """Send one add / update / remove call and return the raw response
+        
+        A 401 (token revoked or expired early) invalidates the shared token
+        and the call is retried once with a fresh one.
+        """
+        url = self._users_url()
+        payload = {
+            'identifier': permission.email,
+            'groupUserAccessRight': permission.role,
+            'principalType': permission.principal_type
+        }
+        
+        with metrics.timer('rbac_sync_fabric_operation_seconds', action=action):
+            for attempt in range(2):
+                if action == 'remove':
+                    response = self.session.delete(f"{url}/{quote(permission.email)}",
+                                                   headers=self._auth_headers(), timeout=self.timeout)
+                else:
+                    send = self.session.post if action == 'add' else self.session.put
+                    response = send(url, headers=self._auth_headers(), json=payload, timeout=self.timeout)
+                if response.status_code != 401 or attempt:
+                    return response
+                self.token_provider.invalidate()
+        return response
+    
     def get_workspace_users(self) -> List[Dict]:
         """Get current workspace users"""
         if not self.access_token:
@@ -293,19 +2764,370 @@ class FabricWorkspaceSync:
             return []
         
         try:
-            url = f"https://api.powerbi.com/v1.0/myorg/groups/{self.workspace_id}/users"
-            headers = {'Authorization': f'Bearer {self.access_token}'}
-            
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            
-            users = response.json().get('value', [])
-            logger.info(f"✅ Retrieved {len(users)} workspace users")
-            return users
-            
+            return self.fetch_workspace_users()
         except Exception as e:
             logger.error(f"❌ Error getting workspace users: {str(e)}")
             return []
+    
+    def fetch_workspace_users(self) -> List[Dict]:
+        """Get current workspace users, raising on failure
+        
+        Reconciliation must not mistake a failed read for an empty workspace.
+        """
+        return list(self.iter_workspace_users())
+    
+    def iter_workspace_users(self, page_size: int = WORKSPACE_USERS_PAGE_SIZE,
+                             prefetch: bool = True) -> Iterator[Dict]:
+        """Yield workspace users lazily, one page at a time, raising on failure
+        
+        Follows @odata.nextLink when the API returns one and otherwise pages
+        with $top/$skip until a short page. With prefetch, the next page is
+        requested on a background thread while the caller consumes this one.
+        """
+        url = self._users_url()
+        
+        def fetch_page(page_url: str, params: Optional[Dict]) -> Tuple[List[Dict], Optional[Tuple[str, Optional[Dict]]]]:
+            response = self.session.get(page_url, headers=self._auth_headers(), params=params, timeout=self.timeout)
+            response.raise_for_status()
+            body = response.json()
+            users = body.get('value', [])
+            if body.get('@odata.nextLink'):
+                return users, (body['@odata.nextLink'], None)
+            if params is not None and len(users) >= page_size:
+                return users, (url, {'$top': page_size, '$skip': params['$skip'] + page_size})
+            return users, None
+        
+        total = 0
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            users, next_page = fetch_page(url, {'$top': page_size, '$skip': 0})
+            while True:
+                pending = executor.submit(fetch_page, *next_page) if executor and next_page else None
+                total += len(users)
+                yield from users
+                if not next_page:
+                    break
+                users, next_page = pending.result() if pending else fetch_page(*next_page)
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+        
+        logger.info(f"✅ Retrieved {total} workspace users")
+    
+    def plan_reconciliation(self, desired: List[FabricPermission], current: Iterable[Dict],
+                            allow_removals: bool = False) -> 'ReconciliationPlan':
+        """Compute the minimal add / update / remove plan from current to desired membership
+        
+        A user mapped through several roles gets the highest-ranked one.
+        Removals only cover individual users and are opt-in; the syncing
+        service principal is never removed. `current` is consumed in a single
+        pass, so it can be the lazy iter_workspace_users() stream.
+        """
+        wanted: Dict[str, FabricPermission] = {}
+        for permission in desired:
+            key = permission.email.lower()
+            existing = wanted.get(key)
+            if existing is None or FABRIC_ROLE_RANK.get(permission.role, 0) > FABRIC_ROLE_RANK.get(existing.role, 0):
+                wanted[key] = permission
+        
+        plan = ReconciliationPlan()
+        protected = {self.client_id.lower()}
+        seen = set()
+        for user in current:
+            identifier = user.get('emailAddress') or user.get('identifier')
+            if not identifier or identifier.lower() in seen:
+                continue
+            key = identifier.lower()
+            seen.add(key)
+            
+            permission = wanted.get(key)
+            if permission is not None:
+                if user.get('groupUserAccessRight') != permission.role:
+                    plan.updates.append(permission)
+                else:
+                    plan.unchanged += 1
+            elif allow_removals and key not in protected and user.get('identifier', '').lower() not in protected:
+                if user.get('principalType', 'User') == 'User':
+                    plan.removes.append(user)
+        
+        plan.adds = [permission for key, permission in wanted.items() if key not in seen]
+        return plan
+
+
+class SyncJournal:
+    """Append-only JSON-lines journal of workspace sync operations
+    
+    Each operation is written as 'pending' before its API call and as 'done'
+    or 'failed' afterwards, so a crashed run can be resumed by skipping
+    everything already done. fsync is batched (every fsync_every records or
+    fsync_interval seconds); an operation whose completion was lost in a
+    crash is simply re-sent, which the Fabric API treats as a no-op.
+    """
+    
+    def __init__(self, path: str, resume: bool = False, fsync_every: int = 200, fsync_interval: float = 1.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.completed = self.load_completed(path) if resume else set()
+        self.skipped = 0
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def operation_key(scope: str, action: str, permission: FabricPermission) -> str:
+        return f"{scope}|{action}|{permission.email.lower()}|{permission.role}"
+    
+    @staticmethod
+    def load_completed(path: str) -> Set[str]:
+        """Keys whose latest journal entry is 'done'; a torn last line from a crash is ignored"""
+        states = {}
+        if not os.path.exists(path):
+            return set()
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                states[entry['op']] = entry['state']
+        return {key for key, state in states.items() if state == 'done'}
+    
+    def pending(self, scope: str, operations: List[Tuple[str, FabricPermission]]) -> List[Tuple[str, FabricPermission]]:
+        """Drop operations a previous run already completed"""
+        remaining = [op for op in operations if self.operation_key(scope, *op) not in self.completed]
+        self.skipped += len(operations) - len(remaining)
+        return remaining
+    
+    def begin(self, scope: str, action: str, permission: FabricPermission):
+        self._write(self.operation_key(scope, action, permission), 'pending')
+    
+    def complete(self, scope: str, action: str, permission: FabricPermission, success: bool):
+        key = self.operation_key(scope, action, permission)
+        self._write(key, 'done' if success else 'failed')
+        if success:
+            self.completed.add(key)
+    
+    def _write(self, key: str, state: str):
+        with self._lock:
+            self._file.write(json.dumps({'op': key, 'state': state, 'at': time.time()}) + '\n')
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+    
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+    
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+
+def _retry_after_seconds(headers, default: float) -> float:
+    """Delay requested by a 429 response's Retry-After header (seconds form)"""
+    try:
+        return max(0.0, float((headers or {}).get('Retry-After', default)))
+    except (TypeError, ValueError):
+        return default
+
+
+class AsyncTokenBucket:
+    """Token-bucket rate limiter shared by concurrent asyncio tasks
+    
+    pause() stops every task from acquiring until the given delay passes,
+    which is how a single HTTP 429 backs off the whole sync at once. A bucket
+    handed out by SharedRateLimit also honours (and propagates) pauses on
+    its parent, so throttling in one workspace backs off all of them.
+    """
+    
+    def __init__(self, rate_per_second: float, burst: Optional[int] = None,
+                 parent: Optional['SharedRateLimit'] = None):
+        self.rate = rate_per_second
+        self.capacity = burst or max(1, int(rate_per_second))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.parent = parent
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                paused_until = max(self.paused_until, self.parent.paused_until if self.parent else 0.0)
+                if now < paused_until:
+                    wait = paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+    
+    def pause(self, seconds: float):
+        """Globally back off for `seconds` and drain any accumulated burst"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated = self.paused_until
+        if self.parent:
+            self.parent.pause(seconds)
+
+
+class SharedRateLimit:
+    """Global request budget split fairly between concurrent workspace syncs
+    
+    Each active workspace gets an equal-rate child bucket from share(); when a
+    workspace finishes and calls release(), the remaining ones are rebalanced
+    so the whole budget stays in use.
+    """
+    
+    def __init__(self, rate_per_second: float):
+        self.rate = rate_per_second
+        self.paused_until = 0.0
+        self.buckets: List[AsyncTokenBucket] = []
+    
+    def share(self) -> AsyncTokenBucket:
+        bucket = AsyncTokenBucket(self.rate, parent=self)
+        self.buckets.append(bucket)
+        self._rebalance()
+        return bucket
+    
+    def release(self, bucket: AsyncTokenBucket):
+        self.buckets.remove(bucket)
+        self._rebalance()
+    
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+    
+    def _rebalance(self):
+        for bucket in self.buckets:
+            bucket.rate = self.rate / len(self.buckets)
+            bucket.capacity = max(1, int(bucket.rate))
+
+
+class AsyncPermissionSyncEngine:
+    """Runs workspace assignments concurrently under a shared rate limit
+    
+    Each call runs on a worker thread over the syncer's pooled session, with at
+    most `concurrency` calls in flight and starts throttled by an
+    AsyncTokenBucket. HTTP 429 responses pause the bucket for the Retry-After
+    delay and the call is retried up to max_attempts times. Results have the
+    same shape as the sequential sync_results entries, in input order.
+    """
+    
+    def __init__(self, syncer: FabricWorkspaceSync, concurrency: int = 8, rate_per_second: float = 10.0,
+                 max_attempts: int = 5, limiter: Optional[AsyncTokenBucket] = None,
+                 journal: Optional[SyncJournal] = None):
+        self.syncer = syncer
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.max_attempts = max_attempts
+        self.limiter = limiter
+        self.journal = journal
+        self.stats = {'calls': 0, 'throttled': 0, 'failed': 0}
+    
+    def run(self, operations: List[Tuple[str, FabricPermission]], dry_run: bool = False) -> List[Dict]:
+        """Synchronous entry point; operations are (action, permission) pairs"""
+        return asyncio.run(self.run_async(operations, dry_run))
+    
+    async def run_async(self, operations: List[Tuple[str, FabricPermission]], dry_run: bool = False) -> List[Dict]:
+        if self.limiter is None:
+            self.limiter = AsyncTokenBucket(self.rate_per_second)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return await asyncio.gather(*(
+                self._run_one(action, permission, dry_run, semaphore, executor)
+                for action, permission in operations
+            ))
+    
+    def run_stream(self, source: 'queue.Queue', dry_run: bool = False) -> List[Dict]:
+        """Synchronous entry point for run_stream_async"""
+        return asyncio.run(self.run_stream_async(source, dry_run))
+    
+    async def run_stream_async(self, source: 'queue.Queue', dry_run: bool = False) -> List[Dict]:
+        """Sync (action, permission) items from a thread queue as they arrive, until None
+        
+        At most 2 x concurrency items are taken off the queue at a time, so a
+        slow API pushes back on whatever is filling it.
+        """
+        if self.limiter is None:
+            self.limiter = AsyncTokenBucket(self.rate_per_second)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        window = asyncio.Semaphore(self.concurrency * 2)
+        loop = asyncio.get_running_loop()
+        tasks = []
+        
+        async def run_and_release(action: str, permission: FabricPermission, executor: ThreadPoolExecutor) -> Dict:
+            try:
+                return await self._run_one(action, permission, dry_run, semaphore, executor)
+            finally:
+                window.release()
+        
+        # One extra worker blocks on the queue while the others make API calls
+        with ThreadPoolExecutor(max_workers=self.concurrency + 1) as executor:
+            while True:
+                await window.acquire()
+                item = await loop.run_in_executor(executor, source.get)
+                if item is None:
+                    break
+                tasks.append(asyncio.ensure_future(run_and_release(*item, executor)))
+            return await asyncio.gather(*tasks)
+    
+    async def _run_one(self, action: str, permission: FabricPermission, dry_run: bool,
+                       semaphore: asyncio.Semaphore, executor: ThreadPoolExecutor) -> Dict:
+        result = {'email': permission.email, 'role': permission.role, 'success': False}
+        if dry_run:
+            logger.info(f"🔍 [DRY RUN] Would {action}: {permission.email} → {permission.role}")
+            result['success'] = True
+            return result
+        
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            if self.journal:
+                self.journal.begin(self.syncer.workspace_id, action, permission)
+            for attempt in range(self.max_attempts):
+                await self.limiter.acquire()
+                self.stats['calls'] += 1
+                try:
+                    response = await loop.run_in_executor(
+                        executor, self.syncer.request_workspace_user, action, permission
+                    )
+                except Exception as e:
+                    logger.error(f"❌ Error on {action} for {permission.email}: {str(e)}")
+                    break
+                
+                if response.status_code == 429:
+                    delay = _retry_after_seconds(response.headers, default=2 ** attempt)
+                    self.stats['throttled'] += 1
+                    logger.warning(f"⏳ Throttled (429) - backing off {delay:.1f}s")
+                    self.limiter.pause(delay)
+                    continue
+                
+                if response.status_code == 200:
+                    logger.info(f"✅ {action.capitalize()} {permission.email} as {permission.role} in workspace")
+                    result['success'] = True
+                else:
+                    logger.error(f"❌ Failed to {action} {permission.email}: {response.status_code} - {response.text}")
+                break
+        
+        if self.journal:
+            self.journal.complete(self.syncer.workspace_id, action, permission, result['success'])
+        if not result['success']:
+            self.stats['failed'] += 1
+        return result
+
+
+# Watch mode rewrites one report instead of adding a timestamped file per cycle
+WATCH_REPORT_PATH = 'rbac_watch_report.txt'
 
 
 class RBACMigrationOrchestrator:
@@ -315,65 +3137,67 @@ class RBACMigrationOrchestrator:
         self.config = config
         self.exporter = None
         self.syncer = None
+        self.role_graph = None
+        self.decision_table = None
+        self.journal = None
+        self.group_directory = None
+        self.output_sink = None
+        self.fingerprints: Dict[str, Optional[str]] = {}
         self.results = {
             'exported_roles': {},
+            'inherited_roles': {},
+            'role_members': {},
             'mapped_permissions': [],
             'sync_results': [],
             'errors': []
         }
     
-    def run_export(self) -> bool:
-        """Step 1: Export Snowflake RBAC"""
-        logger.info("=" * 80)
-        logger.info("STEP 1: EXPORTING SNOWFLAKE RBAC GRANTS")
-        logger.info("=" * 80)
-        
-        try:
-            self.exporter = SnowflakeRBACExporter(
-                account=self.config['snowflake']['account'],
-                user=self.config['snowflake']['user'],
-                password=self.config['snowflake']['password'],
-                warehouse=self.config['snowflake']['warehouse']
-            )
-            
-            if not self.exporter.connect():
+    @timed('rbac_sync_phase_seconds', phase='export')
+    def run_export(self, keep_connection: bool = False) -> bool:
+        """Step 1: Export Snowflake RBAC"""
+        logger.info("=" * 80)
+        logger.info("STEP 1: EXPORTING SNOWFLAKE RBAC GRANTS")
+        logger.info("=" * 80)
+        
+        try:
+            if not self._connect_exporter(keep_alive=keep_connection):
                 return False
             
             roles = self.config['snowflake']['roles_to_export']
-            self.results['exported_roles'] = self.exporter.export_all_roles(roles)
             
-            # Save exports to CSV for documentation
+            sink = self._get_output_sink()
+            
+            if self.config['snowflake'].get('streaming', False):
+                # Grants go straight to the output sink; mapping re-reads them lazily
+                for role in roles:
+                    try:
+                        self.results['exported_roles'][role] = sink.write_role_batches(
+                            role, self.exporter.stream_role_grants(role)
+                        )
+                    except Exception as e:
+                        logger.error(f"❌ Failed to export grants for {role}: {str(e)}")
+                        self.results['errors'].append(f"Export error for {role}: {str(e)}")
+                sink.close()
+                self._record_grant_store()
+                self._export_role_members(roles)
+                if not keep_connection:
+                    self.exporter.close()
+                return True
+            
+            self.results['exported_roles'] = self._export_roles(roles)
+            
+            if self.config['snowflake'].get('include_inherited_roles', False):
+                self._export_inherited_roles()
+            
+            # Save exports for documentation
             for role, grants in self.results['exported_roles'].items():
-                filename = f"{role.lower()}_grants.csv"
-                
-                if HAS_PANDAS:
-                    # Use pandas if available
-                    df = pd.DataFrame([{
-                        'role': g.role,
-                        'privilege': g.privilege,
-                        'granted_on': g.granted_on,
-                        'name': g.name,
-                        'granted_by': g.granted_by
-                    } for g in grants])
-                    df.to_csv(filename, index=False)
-                else:
-                    # Use built-in csv module
-                    with open(filename, 'w', newline='') as csvfile:
-                        fieldnames = ['role', 'privilege', 'granted_on', 'name', 'granted_by']
-                        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                        writer.writeheader()
-                        for g in grants:
-                            writer.writerow({
-                                'role': g.role,
-                                'privilege': g.privilege,
-                                'granted_on': g.granted_on,
-                                'name': g.name,
-                                'granted_by': g.granted_by
-                            })
-                
-                logger.info(f"📁 Saved export: {filename}")
+                sink.write_role_grants(role, grants)
+            sink.close()
             
-            self.exporter.close()
+            self._record_grant_store()
+            self._export_role_members(roles)
+            if not keep_connection:
+                self.exporter.close()
             return True
             
         except Exception as e:
@@ -381,53 +3205,238 @@ class RBACMigrationOrchestrator:
             self.results['errors'].append(f"Export error: {str(e)}")
             return False
     
-    def run_mapping(self) -> bool:
-        """Step 2: Map Snowflake roles to Fabric permissions"""
+    def _connect_exporter(self, keep_alive: bool = False) -> bool:
+        """Connect the Snowflake exporter, reusing a connection that is still open"""
+        if self.exporter is not None and self.exporter.conn is not None:
+            return True
+        self.exporter = SnowflakeRBACExporter(
+            account=self.config['snowflake']['account'],
+            user=self.config['snowflake']['user'],
+            password=self.config['snowflake']['password'],
+            warehouse=self.config['snowflake']['warehouse']
+        )
+        return self.exporter.connect(keep_alive=keep_alive)
+    
+    def _export_role_members(self, roles: List[str]):
+        """Export role -> user membership when user expansion or group mode is enabled"""
+        identity_config = self.config.get('identity', {})
+        if not identity_config.get('expand_users', False) and identity_config.get('principal_mode') != 'group':
+            return
+        self.results['role_members'] = self.exporter.export_role_members(
+            roles,
+            use_account_usage=self.config['snowflake'].get('use_account_usage', False)
+        )
+    
+    def _build_identity_resolver(self) -> Optional[IdentityResolver]:
+        """Resolver chosen by config['identity']['resolver'], wrapped in a TTL cache"""
+        identity_config = self.config.get('identity', {})
+        kind = identity_config.get('resolver', 'none')
+        if kind == 'graph':
+            fabric_config = self.config['fabric']
+            resolver = GraphIdentityResolver(
+                tenant_id=fabric_config['tenant_id'],
+                client_id=fabric_config['client_id'],
+                client_secret=fabric_config['client_secret'],
+                token_provider=get_token_provider(
+                    fabric_config['tenant_id'], fabric_config['client_id'], fabric_config['client_secret'],
+                    GRAPH_API_SCOPE, cache_path=fabric_config.get('token_cache_path')
+                )
+            )
+        elif kind == 'static':
+            resolver = StaticIdentityResolver.from_file(identity_config['static_map_path'])
+        else:
+            return None
+        return CachingIdentityResolver(
+            resolver,
+            ttl_seconds=identity_config.get('cache_ttl', 86400),
+            cache_path=identity_config.get('cache_path')
+        )
+    
+    def _record_grant_store(self):
+        """Record this export as a new run in the local grant store, if configured"""
+        store_path = self.config.get('output', {}).get('grant_store_path')
+        if not store_path:
+            return
+        
+        store = GrantStore(store_path)
+        try:
+            self.results['grant_store_run_id'] = store.record_run({
+                **self.results['inherited_roles'],
+                **self.results['exported_roles']
+            })
+        finally:
+            store.close()
+    
+    def _get_output_sink(self) -> OutputSink:
+        """Sink for exports and the mapping, chosen by config['output']['format']"""
+        if self.output_sink is None:
+            self.output_sink = create_output_sink(self.config.get('output', {}))
+        return self.output_sink
+    
+    def _export_roles(self, roles: List[str]) -> Dict[str, List[SnowflakeGrant]]:
+        """Export roles with whichever export mode the config selects"""
+        snowflake_config = self.config['snowflake']
+        if snowflake_config.get('snapshot_path'):
+            exported = self.exporter.export_incremental(
+                roles,
+                snowflake_config['snapshot_path'],
+                max_workers=snowflake_config.get('export_workers', 1),
+                role_timeout=snowflake_config.get('role_timeout')
+            )
+        elif snowflake_config.get('columnar', False):
+            table = self.exporter.export_grant_table(
+                roles,
+                use_account_usage=snowflake_config.get('use_account_usage', False),
+                max_workers=snowflake_config.get('export_workers', 1),
+                role_timeout=snowflake_config.get('role_timeout')
+            )
+            # by_role() only sees roles with rows; keep zero-grant roles like the other modes
+            exported = {
+                role: GrantTable(table.pool) for role in roles
+                if role not in self.exporter.failed_roles
+            }
+            exported.update(table.by_role())
+        else:
+            exported = self.exporter.export_all_roles(
+                roles,
+                use_account_usage=snowflake_config.get('use_account_usage', False),
+                max_workers=snowflake_config.get('export_workers', 1),
+                role_timeout=snowflake_config.get('role_timeout')
+            )
+        for role, error in self.exporter.failed_roles.items():
+            self.results['errors'].append(f"Export error for {role}: {error}")
+        return exported
+    
+    def _export_inherited_roles(self):
+        """Export roles granted to the exported roles until the hierarchy is complete"""
+        graph = RoleGraph.from_grants(self.results['exported_roles'])
+        attempted = set(self.results['exported_roles'])
+        
+        missing = graph.missing_roles() - attempted
+        while missing:
+            logger.info(f"🔗 Exporting {len(missing)} inherited roles")
+            attempted |= missing
+            inherited = self._export_roles(sorted(missing))
+            self.results['inherited_roles'].update(inherited)
+            for role, grants in inherited.items():
+                graph.set_role_grants(role, grants)
+            missing = graph.missing_roles() - attempted
+        
+        self.role_graph = graph
+    
+    @timed('rbac_sync_phase_seconds', phase='mapping')
+    def run_mapping(self, roles: Optional[List[str]] = None) -> bool:
+        """Step 2: Map Snowflake roles to Fabric permissions (only `roles`, replacing their old mapping, if given)"""
         logger.info("=" * 80)
         logger.info("STEP 2: MAPPING TO FABRIC PERMISSIONS")
         logger.info("=" * 80)
         
         try:
-            for role, grants in self.results['exported_roles'].items():
-                permission = FabricPermissionMapper.map_role(role, grants)
+            expand_users = self.config.get('identity', {}).get('expand_users', False)
+            group_mode = self.config.get('identity', {}).get('principal_mode') == 'group'
+            role_permissions = []
+            effective = self.config.get('mapping', {}).get('effective_privileges', False)
+            if effective and self.config.get('snowflake', {}).get('streaming', False):
+                # Resolving inheritance would pull every streamed grant back into memory
+                logger.warning("⚠️  Streaming export enabled - mapping on direct grants only")
+                effective = False
+            rules_path = self.config.get('mapping', {}).get('rules_path')
+            if rules_path and self.decision_table is None:
+                self.decision_table = MappingDecisionTable.from_file(rules_path)
+            
+            if effective and self.role_graph is None:
+                self.role_graph = RoleGraph.from_grants({
+                    **self.results['inherited_roles'],
+                    **self.results['exported_roles']
+                })
+            
+            # Map on everything each role can do, including inherited privileges
+            role_grants = {
+                role: self.role_graph.effective_grants(role) if effective else grants
+                for role, grants in self.results['exported_roles'].items()
+                if roles is None or role in roles
+            }
+            
+            # Reuse results for roles whose grants and rules are unchanged since a previous run
+            cache = None
+            cached = {}
+            fingerprints = {}
+            cache_path = self.config.get('mapping', {}).get('cache_path')
+            if cache_path:
+                cache = MappingCache(cache_path, self.config['mapping'].get('cache_max_entries', 50000))
+                rules_version = self.decision_table.version if self.decision_table else BUILTIN_MAPPING_VERSION
+                for role, grants in role_grants.items():
+                    fingerprints[role] = grant_fingerprint(role, grants, rules_version)
+                    hit = cache.get(fingerprints[role])
+                    if hit is not None:
+                        cached[role] = hit
+            
+            analysis_frame = None
+            if HAS_PANDAS and self.config.get('mapping', {}).get('batch_analysis', False):
+                uncached = {role: grants for role, grants in role_grants.items() if role not in cached}
+                if uncached:
+                    analysis_frame = FabricPermissionMapper.analyze_grants_batch(uncached)
+                    self.results['grant_analysis'] = analysis_frame
+            
+            for role, grants in role_grants.items():
+                analysis = None
+                if role in cached:
+                    permission, analysis = cached[role]
+                else:
+                    permission = FabricPermissionMapper.map_role(role, grants, self.decision_table)
+                    if permission:
+                        # Analyze grants for detailed logging
+                        if analysis_frame is not None and role in analysis_frame.index:
+                            analysis = analysis_frame.loc[role].to_dict()
+                        else:
+                            analysis = FabricPermissionMapper.analyze_grants(grants)
+                    if cache:
+                        cache.put(fingerprints[role], role, permission, analysis)
+                
+                if permission and not permission.email and not (expand_users or group_mode):
+                    logger.warning(f"⚠️  No user email for role {role} (set {role.upper()}_EMAIL) - skipping")
+                    permission = None
                 
                 if permission:
-                    self.results['mapped_permissions'].append(permission)
-                    
-                    # Analyze grants for detailed logging
-                    analysis = FabricPermissionMapper.analyze_grants(grants)
+                    role_permissions.append(permission)
                     
                     logger.info(f"\n📋 {role} → Fabric {permission.role}")
-                    logger.info(f"   Email: {permission.email}")
+                    if expand_users or group_mode:
+                        logger.info(f"   Users: {len(self.results['role_members'].get(role, []))}")
+                    else:
+                        logger.info(f"   Email: {permission.email}")
                     logger.info(f"   Grants: {analysis['total_grants']}")
                     logger.info(f"   Tables: {len(analysis['table_privileges'])}")
+                    if effective and self.role_graph.inherited_roles(role):
+                        logger.info(f"   Inherits: {', '.join(sorted(self.role_graph.inherited_roles(role)))}")
                     logger.info(f"   Reasoning: {permission.reasoning}")
             
-            # Save mapping summary
-            if HAS_PANDAS:
-                df = pd.DataFrame([{
-                    'snowflake_role': p.snowflake_role,
-                    'fabric_role': p.role,
-                    'user_email': p.email,
-                    'grant_count': p.grant_count,
-                    'reasoning': p.reasoning
-                } for p in self.results['mapped_permissions']])
-                df.to_csv('snowflake_fabric_role_mapping.csv', index=False)
-            else:
-                with open('snowflake_fabric_role_mapping.csv', 'w', newline='') as csvfile:
-                    fieldnames = ['snowflake_role', 'fabric_role', 'user_email', 'grant_count', 'reasoning']
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    writer.writeheader()
-                    for p in self.results['mapped_permissions']:
-                        writer.writerow({
-                            'snowflake_role': p.snowflake_role,
-                            'fabric_role': p.role,
-                            'user_email': p.email,
-                            'grant_count': p.grant_count,
-                            'reasoning': p.reasoning
-                        })
-            
-            logger.info("\n📁 Saved mapping: snowflake_fabric_role_mapping.csv")
+            if cache:
+                evicted = cache.evict()
+                self.results['mapping_cache'] = dict(cache.stats, evicted=evicted)
+                logger.info(f"🗃️  Mapping cache: {cache.stats['hits']} hits, {cache.stats['misses']} misses, {evicted} evicted")
+                cache.close()
+            
+            if group_mode:
+                role_permissions = FabricPermissionMapper.to_group_principals(
+                    role_permissions, self.config['identity'].get('group_name_template', 'sg-fabric-{role}')
+                )
+                logger.info(f"👥 Assigning {len(role_permissions)} roles through security groups")
+            elif expand_users:
+                resolver = self._build_identity_resolver()
+                role_permissions = FabricPermissionMapper.expand_to_users(
+                    role_permissions, self.results['role_members'], resolver
+                )
+                logger.info(f"👥 Expanded to {len(role_permissions)} user assignments")
+                if isinstance(resolver, CachingIdentityResolver):
+                    logger.info(f"🗃️  Identity cache: {resolver.stats['hits']} hits, {resolver.stats['misses']} misses")
+            if roles is not None:
+                self.results['mapped_permissions'] = [
+                    p for p in self.results['mapped_permissions'] if p.snowflake_role not in role_grants
+                ]
+            self.results['mapped_permissions'].extend(role_permissions)
+            
+            self._save_mapping()
             
             return True
             
@@ -436,26 +3445,58 @@ class RBACMigrationOrchestrator:
             self.results['errors'].append(f"Mapping error: {str(e)}")
             return False
     
-    def run_sync(self, dry_run: bool = False) -> bool:
-        """Step 3: Sync permissions to Fabric workspace"""
+    def _save_mapping(self):
+        """Save the mapping summary for documentation"""
+        filename = self._get_output_sink().write_mapping(self.results['mapped_permissions'])
+        logger.info(f"\n📁 Saved mapping: {filename}")
+    
+    @timed('rbac_sync_phase_seconds', phase='sync')
+    def run_sync(self, dry_run: bool = False, reconcile: Optional[bool] = None,
+                 principals: Optional[Set[str]] = None) -> bool:
+        """Step 3: Sync permissions to Fabric workspace (reconcile only `principals`, if given)"""
         logger.info("=" * 80)
         logger.info(f"STEP 3: SYNCING TO FABRIC WORKSPACE {'(DRY RUN)' if dry_run else ''}")
         logger.info("=" * 80)
         
+        if reconcile is None:
+            reconcile = self.config['fabric'].get('reconcile', False)
+        
+        self._open_journal(dry_run)
+        
         try:
-            self.syncer = FabricWorkspaceSync(
-                workspace_id=self.config['fabric']['workspace_id'],
-                tenant_id=self.config['fabric']['tenant_id'],
-                client_id=self.config['fabric']['client_id'],
-                client_secret=self.config['fabric']['client_secret']
-            )
+            if self.config.get('identity', {}).get('principal_mode') == 'group':
+                self._sync_group_principals(dry_run)
+            
+            workspaces = self.config['fabric'].get('workspaces')
+            if workspaces:
+                return self.run_multi_workspace_sync(workspaces, dry_run=dry_run, reconcile=reconcile,
+                                                     principals=principals)
+            
+            # Reuse the syncer, its pooled session and token across watch cycles
+            if self.syncer is None or self.syncer.workspace_id != self.config['fabric']['workspace_id']:
+                self.syncer = self._create_syncer(self.config['fabric']['workspace_id'])
+            
+            if reconcile:
+                return self._run_reconcile(dry_run, principals)
             
             if not dry_run and not self.syncer.authenticate():
                 return False
             
+            operations = self._pending_operations(
+                self.syncer.workspace_id, [('add', p) for p in self.results['mapped_permissions']]
+            )
+            
+            if self.config['fabric'].get('concurrency', 1) > 1:
+                results = self._run_concurrent(operations, dry_run)
+                self.results['sync_results'].extend(results)
+                # Only this call's operations: sync_results also holds earlier runs' results
+                success_count = sum(r['success'] for r in results)
+                logger.info(f"\n✅ Successfully synced {success_count}/{len(operations)} permissions")
+                return True
+            
             success_count = 0
-            for permission in self.results['mapped_permissions']:
-                result = self.syncer.add_workspace_user(permission, dry_run=dry_run)
+            for action, permission in operations:
+                result = self._apply_operation(action, permission, dry_run)
                 self.results['sync_results'].append({
                     'email': permission.email,
                     'role': permission.role,
@@ -464,16 +3505,510 @@ class RBACMigrationOrchestrator:
                 if result:
                     success_count += 1
             
-            logger.info(f"\n✅ Successfully synced {success_count}/{len(self.results['mapped_permissions'])} permissions")
+            logger.info(f"\n✅ Successfully synced {success_count}/{len(operations)} permissions")
             return True
             
         except Exception as e:
             logger.error(f"❌ Sync failed: {str(e)}")
             self.results['errors'].append(f"Sync error: {str(e)}")
             return False
+        
+        finally:
+            self._close_journal()
+    
+    def _open_journal(self, dry_run: bool):
+        """Open the sync journal when one is configured (never for dry runs)"""
+        journal_path = self.config['fabric'].get('journal_path')
+        if journal_path and not dry_run:
+            self.journal = SyncJournal(journal_path, resume=self.config['fabric'].get('resume', False))
+            if self.journal.completed:
+                logger.info(f"📒 Resuming from {journal_path}: {len(self.journal.completed)} operations already done")
+    
+    def _close_journal(self):
+        if self.journal:
+            self.journal.close()
+            self.results['journal'] = {'path': self.journal.path, 'skipped': self.journal.skipped}
+    
+    def _build_group_directory(self) -> GroupDirectory:
+        """Directory chosen by config['identity']['group_directory'] (graph or memory)"""
+        if self.group_directory is None:
+            if self.config.get('identity', {}).get('group_directory', 'graph') == 'memory':
+                self.group_directory = InMemoryGroupDirectory()
+            else:
+                fabric_config = self.config['fabric']
+                self.group_directory = GraphGroupDirectory(
+                    tenant_id=fabric_config['tenant_id'],
+                    client_id=fabric_config['client_id'],
+                    client_secret=fabric_config['client_secret'],
+                    token_provider=get_token_provider(
+                        fabric_config['tenant_id'], fabric_config['client_id'], fabric_config['client_secret'],
+                        GRAPH_API_SCOPE, cache_path=fabric_config.get('token_cache_path')
+                    )
+                )
+        return self.group_directory
+    
+    def _sync_group_principals(self, dry_run: bool):
+        """Group principal mode: find or create each role's group and sync its members
+        
+        Mapped permissions are re-pointed at the group object IDs so the
+        workspace sync makes one call per role rather than one per user.
+        """
+        directory = self._build_group_directory()
+        resolver = self._build_identity_resolver()
+        role_members = self.results['role_members']
+        permissions = self.results['mapped_permissions']
+        
+        users = list(dict.fromkeys(u for p in permissions for u in role_members.get(p.snowflake_role, [])))
+        principals = resolver.resolve_batch(users) if resolver and users else {}
+        
+        self.results.setdefault('group_sync', {})
+        resolved = []
+        for permission in permissions:
+            group_id = permission.principal_id or directory.ensure_group(permission.email, create=not dry_run)
+            member_ids = [principals.get(u) if resolver else u for u in role_members.get(permission.snowflake_role, [])]
+            if resolver and not all(member_ids):
+                logger.warning(f"⚠️  {member_ids.count(None)} members of {permission.snowflake_role} "
+                               f"could not be resolved - leaving them out of the group")
+            member_ids = [m for m in member_ids if m]
+            
+            if group_id:
+                summary = directory.sync_members(
+                    group_id, member_ids,
+                    allow_removals=self.config['fabric'].get('allow_removals', False),
+                    dry_run=dry_run
+                )
+            else:
+                summary = {'added': len(set(member_ids)), 'removed': 0, 'unchanged': 0}
+            
+            group_name = self.results['group_sync'].get(permission.snowflake_role, {}).get('group', permission.email)
+            self.results['group_sync'][permission.snowflake_role] = dict(summary, group=group_name, group_id=group_id)
+            logger.info(f"👥 {'[DRY RUN] ' if dry_run else ''}{group_name}: +{summary['added']} "
+                        f"-{summary['removed']} members ({summary['unchanged']} unchanged)")
+            resolved.append(replace(permission, email=group_id, principal_id=group_id) if group_id else permission)
+        
+        self.results['mapped_permissions'] = resolved
+    
+    def _pending_operations(self, workspace_id: str,
+                            operations: List[Tuple[str, FabricPermission]]) -> List[Tuple[str, FabricPermission]]:
+        """Operations still to run, leaving out any a resumed journal marks as done"""
+        if not self.journal:
+            return operations
+        remaining = self.journal.pending(workspace_id, operations)
+        if len(remaining) < len(operations):
+            logger.info(f"📒 Skipping {len(operations) - len(remaining)} operations completed by a previous run")
+        return remaining
+    
+    def _apply_operation(self, action: str, permission: FabricPermission, dry_run: bool) -> bool:
+        """Run one sequential sync operation, journaling it when a journal is open"""
+        if self.journal:
+            self.journal.begin(self.syncer.workspace_id, action, permission)
+        if action == 'add':
+            result = self.syncer.add_workspace_user(permission, dry_run=dry_run)
+        elif action == 'update':
+            result = self.syncer.update_workspace_user(permission, dry_run=dry_run)
+        else:
+            result = self.syncer.remove_workspace_user(permission.email, dry_run=dry_run)
+        if self.journal:
+            self.journal.complete(self.syncer.workspace_id, action, permission, result)
+        return result
+    
+    def _run_concurrent(self, operations: List[Tuple[str, FabricPermission]], dry_run: bool) -> List[Dict]:
+        """Run sync operations through the async engine using the configured limits"""
+        engine = AsyncPermissionSyncEngine(
+            self.syncer,
+            concurrency=self.config['fabric'].get('concurrency', 8),
+            rate_per_second=self.config['fabric'].get('rate_limit', 10.0),
+            journal=self.journal
+        )
+        results = engine.run(operations, dry_run=dry_run)
+        logger.info(f"⚡ Async sync: {engine.stats['calls']} calls, {engine.stats['throttled']} throttled, "
+                    f"{engine.stats['failed']} failed")
+        return results
+    
+    @staticmethod
+    def _plan_operations(plan: ReconciliationPlan) -> List[Tuple[str, FabricPermission]]:
+        """Flatten a reconciliation plan into (action, permission) pairs for the async engine"""
+        return [('add', p) for p in plan.adds] + [('update', p) for p in plan.updates] + [
+            ('remove', FabricPermission(email=u.get('emailAddress') or u.get('identifier'),
+                                        role=u.get('groupUserAccessRight'), snowflake_role='',
+                                        grant_count=0, reasoning=''))
+            for u in plan.removes
+        ]
+    
+    def run_multi_workspace_sync(self, workspaces: List[Dict], dry_run: bool = False,
+                                 reconcile: bool = False, principals: Optional[Set[str]] = None) -> bool:
+        """Sync the mapped permissions to several workspaces concurrently
+        
+        Each workspace entry has a workspace_id and optionally a name, its own
+        concurrency and role_overrides ({SNOWFLAKE_ROLE: fabric role, or null
+        to leave that role out}). Up to fabric.workspace_parallelism
+        workspaces run at once and share fabric.rate_limit fairly. With
+        principals given, reconciliation only touches those users.
+        """
+        fabric_config = self.config['fabric']
+        self.results['workspace_results'] = {}
+        
+        async def sync_all():
+            limit = SharedRateLimit(fabric_config.get('rate_limit', 10.0))
+            gate = asyncio.Semaphore(fabric_config.get('workspace_parallelism', 4))
+            
+            async def sync_one(workspace: Dict):
+                async with gate:
+                    limiter = limit.share()
+                    try:
+                        return await self._sync_workspace(workspace, limiter, dry_run, reconcile, principals)
+                    finally:
+                        limit.release(limiter)
+            
+            return await asyncio.gather(*(sync_one(w) for w in workspaces))
+        
+        results = []
+        for workspace_result in asyncio.run(sync_all()):
+            name = workspace_result['name']
+            self.results['workspace_results'][name] = workspace_result
+            results.extend(dict(r, workspace=name) for r in workspace_result['sync_results'])
+            self.results['errors'].extend(f"[{name}] {error}" for error in workspace_result['errors'])
+        self.results['sync_results'].extend(results)
+        
+        success_count = sum(r['success'] for r in results)
+        logger.info(f"\n✅ Synced {success_count}/{len(results)} changes "
+                    f"across {len(workspaces)} workspaces")
+        return True
+    
+    async def _sync_workspace(self, workspace: Dict, limiter: AsyncTokenBucket,
+                              dry_run: bool, reconcile: bool, principals: Optional[Set[str]] = None) -> Dict:
+        """Plan and apply one workspace's assignments under its share of the rate limit"""
+        workspace_id = workspace['workspace_id']
+        name = workspace.get('name', workspace_id)
+        result = {'name': name, 'workspace_id': workspace_id, 'sync_results': [], 'errors': []}
+        concurrency = workspace.get('concurrency', self.config['fabric'].get('concurrency', 1))
+        permissions = self._apply_workspace_overrides(self.results['mapped_permissions'], workspace)
+        
+        syncer = self._create_syncer(workspace_id)
+        try:
+            # A plain dry run never calls the API; reconciliation still reads membership
+            authenticated = (reconcile or not dry_run) and await asyncio.to_thread(syncer.authenticate)
+            if not authenticated and not dry_run:
+                result['errors'].append("Fabric authentication failed")
+                return result
+            
+            if reconcile:
+                current = syncer.iter_workspace_users() if authenticated else []
+                if principals is not None:
+                    permissions, current = self._limit_to_principals(permissions, current, principals)
+                plan = await asyncio.to_thread(
+                    syncer.plan_reconciliation, permissions, current,
+                    allow_removals=self.config['fabric'].get('allow_removals', False)
+                )
+                result['reconciliation'] = plan.summary()
+                logger.info(f"🧮 [{name}] Reconciliation plan: {plan.summary()}")
+                operations = self._plan_operations(plan)
+            else:
+                operations = [('add', p) for p in permissions]
+            operations = self._pending_operations(workspace_id, operations)
+            
+            engine = AsyncPermissionSyncEngine(syncer, concurrency=max(1, concurrency), limiter=limiter,
+                                               journal=self.journal)
+            outcomes = await engine.run_async(operations, dry_run=dry_run)
+            for (action, _), outcome in zip(operations, outcomes):
+                result['sync_results'].append(dict(outcome, action=action) if reconcile else outcome)
+            logger.info(f"⚡ [{name}] {engine.stats['calls']} calls, {engine.stats['throttled']} throttled, "
+                        f"{engine.stats['failed']} failed")
+        except Exception as e:
+            logger.error(f"❌ [{name}] Sync failed: {str(e)}")
+            result['errors'].append(f"Sync error: {str(e)}")
+        finally:
+            syncer.close()
+        return result
+    
+    @staticmethod
+    def _apply_workspace_overrides(permissions: List[FabricPermission], workspace: Dict) -> List[FabricPermission]:
+        """Apply a workspace's role_overrides; a null override drops that Snowflake role"""
+        overrides = workspace.get('role_overrides') or {}
+        if not overrides:
+            return list(permissions)
+        
+        adjusted = []
+        for permission in permissions:
+            if permission.snowflake_role not in overrides:
+                adjusted.append(permission)
+            elif overrides[permission.snowflake_role]:
+                adjusted.append(replace(permission, role=overrides[permission.snowflake_role],
+                                        reasoning=f"{permission.reasoning} (workspace override)"))
+        return adjusted
+    
+    def _create_syncer(self, workspace_id: str) -> FabricWorkspaceSync:
+        """Build a syncer for a workspace using the configured HTTP settings"""
+        fabric_config = self.config['fabric']
+        return FabricWorkspaceSync(
+            workspace_id=workspace_id,
+            tenant_id=fabric_config['tenant_id'],
+            client_id=fabric_config['client_id'],
+            client_secret=fabric_config['client_secret'],
+            timeout=(fabric_config.get('connect_timeout', DEFAULT_HTTP_TIMEOUT[0]),
+                     fabric_config.get('read_timeout', DEFAULT_HTTP_TIMEOUT[1])),
+            max_retries=fabric_config.get('max_retries', 5),
+            pool_size=max(20, fabric_config.get('concurrency', 1)),
+            token_provider=get_token_provider(
+                fabric_config['tenant_id'], fabric_config['client_id'], fabric_config['client_secret'],
+                FABRIC_API_SCOPE, cache_path=fabric_config.get('token_cache_path'),
+                login_base_url=fabric_config.get('login_base_url', LOGIN_BASE_URL)
+            ),
+            api_base_url=fabric_config.get('api_base_url', FABRIC_API_BASE_URL)
+        )
+    
+    @staticmethod
+    def _limit_to_principals(desired: List[FabricPermission], current: Iterable[Dict],
+                             principals: Set[str]) -> Tuple[List[FabricPermission], Iterator[Dict]]:
+        """Narrow a reconciliation to the given users, leaving every other workspace user alone (removals too)"""
+        desired = [p for p in desired if p.email.lower() in principals]
+        current = (u for u in current
+                   if (u.get('emailAddress') or u.get('identifier') or '').lower() in principals)
+        return desired, current
+    
+    def _run_reconcile(self, dry_run: bool, principals: Optional[Set[str]] = None) -> bool:
+        """Apply only the difference between current and desired workspace membership"""
+        # Reading membership is safe even in a dry run
+        if self.syncer.authenticate():
+            current = self.syncer.iter_workspace_users()
+        elif dry_run:
+            logger.warning("⚠️  Could not read workspace membership - planning against an empty workspace")
+            current = []
+        else:
+            return False
+        
+        desired = self.results['mapped_permissions']
+        if principals is not None:
+            desired, current = self._limit_to_principals(desired, current, principals)
+        
+        plan = self.syncer.plan_reconciliation(
+            desired,
+            current,
+            allow_removals=self.config['fabric'].get('allow_removals', False)
+        )
+        self.results['reconciliation'] = plan.summary()
+        logger.info(f"🧮 Reconciliation plan: {plan.summary()}")
+        
+        operations = self._pending_operations(self.syncer.workspace_id, self._plan_operations(plan))
+        
+        results = []
+        if self.config['fabric'].get('concurrency', 1) > 1:
+            for (action, _), result in zip(operations, self._run_concurrent(operations, dry_run)):
+                results.append(dict(result, action=action))
+        else:
+            for action, permission in operations:
+                result = self._apply_operation(action, permission, dry_run)
+                results.append({
+                    'email': permission.email, 'role': permission.role, 'success': result, 'action': action
+                })
+        self.results['sync_results'].extend(results)
+        
+        success_count = sum(r['success'] for r in results)
+        logger.info(f"\n✅ Applied {success_count}/{len(operations)} changes "
+                    f"({plan.unchanged} assignments already up to date)")
+        return True
+    
+    @timed('rbac_sync_phase_seconds', phase='pipeline')
+    def run_pipeline(self, dry_run: bool = False) -> bool:
+        """Export, map and sync in overlapping stages connected by bounded queues
+        
+        Roles are exported in batches of pipeline.export_batch_size through
+        the same bulk/parallel exporters as a normal run; each role is mapped
+        as soon as its batch is exported and its assignments are synced while
+        later batches are still exporting. Stages run on their own threads and
+        a full queue blocks the stage feeding it. Grants (inherited roles'
+        too) are written through the output sink rather than kept, and the
+        role graph only holds the current batch, so memory grows with the
+        batch size, its inherited roles and pipeline.queue_depth rather than
+        with the number of roles.
+        """
+        logger.info("=" * 80)
+        logger.info(f"PIPELINED EXPORT → MAPPING → SYNC {'(DRY RUN)' if dry_run else ''}")
+        logger.info("=" * 80)
+        
+        depth = self.config.get('pipeline', {}).get('queue_depth', 16)
+        mapped_queue = queue.Queue(maxsize=depth)
+        sync_queue = queue.Queue(maxsize=depth)
+        stop = threading.Event()
+        
+        try:
+            self.exporter = SnowflakeRBACExporter(
+                account=self.config['snowflake']['account'],
+                user=self.config['snowflake']['user'],
+                password=self.config['snowflake']['password'],
+                warehouse=self.config['snowflake']['warehouse']
+            )
+            if not self.exporter.connect():
+                return False
+            
+            rules_path = self.config.get('mapping', {}).get('rules_path')
+            if rules_path and self.decision_table is None:
+                self.decision_table = MappingDecisionTable.from_file(rules_path)
+            
+            self.syncer = self._create_syncer(self.config['fabric']['workspace_id'])
+            if not dry_run and not self.syncer.authenticate():
+                return False
+            self._open_journal(dry_run)
+            
+            stages = [
+                threading.Thread(target=self._pipeline_export, name='pipeline-export',
+                                 args=(self.config['snowflake']['roles_to_export'], mapped_queue, stop)),
+                threading.Thread(target=self._pipeline_map, name='pipeline-map',
+                                 args=(mapped_queue, sync_queue, stop))
+            ]
+            for stage in stages:
+                stage.start()
+            
+            try:
+                engine = AsyncPermissionSyncEngine(
+                    self.syncer,
+                    concurrency=max(1, self.config['fabric'].get('concurrency', 1)),
+                    rate_per_second=self.config['fabric'].get('rate_limit', 10.0),
+                    journal=self.journal
+                )
+                self.results['sync_results'].extend(engine.run_stream(sync_queue, dry_run=dry_run))
+            except BaseException:
+                stop.set()
+                raise
+            finally:
+                for stage in stages:
+                    stage.join()
+            
+            self._get_output_sink().close()
+            self._record_grant_store()
+            self._save_mapping()
+            success_count = sum(r['success'] for r in self.results['sync_results'])
+            logger.info(f"\n✅ Pipeline synced {success_count}/{len(self.results['sync_results'])} permissions "
+                        f"from {len(self.results['exported_roles'])} roles")
+            return True
+        
+        except Exception as e:
+            logger.error(f"❌ Pipeline failed: {str(e)}")
+            self.results['errors'].append(f"Pipeline error: {str(e)}")
+            return False
+        
+        finally:
+            self._close_journal()
+            if self.exporter:
+                self.exporter.close()
+    
+    @staticmethod
+    def _pipeline_put(target: 'queue.Queue', item, stop: threading.Event) -> bool:
+        """Blocking put that gives up once the pipeline is stopping"""
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    @staticmethod
+    def _pipeline_get(source: 'queue.Queue', stop: threading.Event):
+        """Blocking get that returns None (end of stream) once the pipeline is stopping
+        
+        A stopping upstream stage may not manage to deliver its None sentinel.
+        """
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+    
+    def _pipeline_export(self, roles: List[str], target: 'queue.Queue', stop: threading.Event):
+        """Pipeline stage 1: export roles in batches (plus the roles they inherit) and hand each to mapping
+        
+        The role graph is rebuilt per batch, so an inherited role shared by
+        several batches is exported again for each of them.
+        """
+        effective = self.config.get('mapping', {}).get('effective_privileges', False)
+        expand_users = self.config.get('identity', {}).get('expand_users', False)
+        batch_size = max(1, self.config.get('pipeline', {}).get('export_batch_size', 100))
+        sink = self._get_output_sink()
+        try:
+            for start in range(0, len(roles), batch_size):
+                if stop.is_set():
+                    break
+                batch = roles[start:start + batch_size]
+                exported = self._export_roles(batch)
+                graph = RoleGraph.from_grants(exported)
+                attempted = set(batch)
+                
+                missing = graph.missing_roles() - attempted if effective else set()
+                while missing:
+                    logger.info(f"🔗 Exporting {len(missing)} roles inherited by roles {start + 1}-{start + len(batch)}")
+                    attempted |= missing
+                    inherited = self._export_roles(sorted(missing))
+                    for inherited_role, inherited_grants in inherited.items():
+                        graph.set_role_grants(inherited_role, inherited_grants)
+                        if inherited_role not in self.results['inherited_roles']:
+                            self.results['inherited_roles'][inherited_role] = sink.write_role_grants(
+                                inherited_role, inherited_grants
+                            )
+                    missing = graph.missing_roles() - attempted
+                
+                members = {}
+                if expand_users:
+                    members = self.exporter.export_role_members(
+                        list(exported), use_account_usage=self.config['snowflake'].get('use_account_usage', False)
+                    )
+                    self.results['role_members'].update(members)
+                
+                for role in batch:
+                    if role not in exported:
+                        continue
+                    grants = exported[role]
+                    self.results['exported_roles'][role] = sink.write_role_grants(role, grants)
+                    mapped_grants = graph.effective_grants(role) if effective else grants
+                    if not self._pipeline_put(target, (role, mapped_grants, members.get(role, [])), stop):
+                        return
+        except Exception as e:
+            logger.error(f"❌ Pipeline export failed: {str(e)}")
+            self.results['errors'].append(f"Export error: {str(e)}")
+        finally:
+            self._pipeline_put(target, None, stop)
+    
+    def _pipeline_map(self, source: 'queue.Queue', target: 'queue.Queue', stop: threading.Event):
+        """Pipeline stage 2: map each exported role and queue its workspace assignments"""
+        expand_users = self.config.get('identity', {}).get('expand_users', False)
+        resolver = self._build_identity_resolver() if expand_users else None
+        failed = False
+        try:
+            while True:
+                item = self._pipeline_get(source, stop)
+                if item is None:
+                    break
+                role, grants, members = item
+                permission = FabricPermissionMapper.map_role(role, grants, self.decision_table)
+                if permission and not permission.email and not expand_users:
+                    logger.warning(f"⚠️  No user email for role {role} (set {role.upper()}_EMAIL) - skipping")
+                    permission = None
+                if not permission:
+                    continue
+                
+                permissions = [permission]
+                if expand_users:
+                    permissions = FabricPermissionMapper.expand_to_users(permissions, {role: members}, resolver)
+                self.results['mapped_permissions'].extend(permissions)
+                logger.info(f"📋 {role} → Fabric {permission.role} ({len(permissions)} assignments)")
+                
+                operations = self._pending_operations(self.syncer.workspace_id, [('add', p) for p in permissions])
+                for operation in operations:
+                    if not self._pipeline_put(target, operation, stop):
+                        return
+        except Exception as e:
+            failed = True
+            logger.error(f"❌ Pipeline mapping failed: {str(e)}")
+            self.results['errors'].append(f"Mapping error: {str(e)}")
+        finally:
+            self._pipeline_put(target, None, stop)
+            if failed:
+                # Unblock the export stage, which may be waiting on a full queue
+                stop.set()
     
-    def generate_report(self) -> str:
-        """Generate migration report"""
+    def generate_report(self, report_path: Optional[str] = None) -> str:
+        """Generate migration report (to report_path, overwritten, or a new timestamped file)"""
         logger.info("=" * 80)
         logger.info("MIGRATION REPORT")
         logger.info("=" * 80)
@@ -484,6 +4019,32 @@ class RBACMigrationOrchestrator:
         report.append(f"Total Grants Exported: {sum(len(g) for g in self.results['exported_roles'].values())}")
         report.append(f"Permissions Mapped: {len(self.results['mapped_permissions'])}")
         report.append(f"Sync Success Rate: {sum(r['success'] for r in self.results['sync_results'])}/{len(self.results['sync_results'])}")
+        if 'reconciliation' in self.results:
+            plan = self.results['reconciliation']
+            report.append(f"Reconciliation: {plan['add']} added, {plan['update']} updated, "
+                          f"{plan['remove']} removed, {plan['unchanged']} unchanged")
+        if self.results.get('group_sync'):
+            groups = self.results['group_sync'].values()
+            report.append(f"Security Groups: {len(groups)} synced, "
+                          f"{sum(g['added'] for g in groups)} members added, "
+                          f"{sum(g['removed'] for g in groups)} removed")
+        if self.results.get('journal', {}).get('skipped'):
+            report.append(f"Resumed: {self.results['journal']['skipped']} operations already completed "
+                          f"(journal {self.results['journal']['path']})")
+        if self.results.get('workspace_results'):
+            report.append(f"\nWorkspaces Synced: {len(self.results['workspace_results'])}")
+            for name, workspace in self.results['workspace_results'].items():
+                synced = workspace['sync_results']
+                line = f"   - {name}: {sum(r['success'] for r in synced)}/{len(synced)} succeeded"
+                if workspace.get('reconciliation'):
+                    plan = workspace['reconciliation']
+                    line += (f" ({plan['add']} added, {plan['update']} updated, "
+                             f"{plan['remove']} removed, {plan['unchanged']} unchanged)")
+                if workspace['errors']:
+                    line += f", {len(workspace['errors'])} errors"
+                report.append(line)
+        
+        report.extend(self._timing_lines())
         
         if self.results['errors']:
             report.append(f"\n⚠️  Errors Encountered: {len(self.results['errors'])}")
@@ -498,57 +4059,269 @@ class RBACMigrationOrchestrator:
         logger.info(report_text)
         
         # Save to file
-        with open(f'rbac_migration_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.txt', 'w') as f:
+        filename = report_path or f'rbac_migration_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.txt'
+        tmp_path = f"{filename}.tmp"
+        with open(tmp_path, 'w') as f:
             f.write(report_text)
+        os.replace(tmp_path, filename)
+        metrics.inc('rbac_sync_output_bytes_total', _file_size(filename), format='text', kind='report')
         
         return report_text
     
-    def run_full_migration(self, dry_run: bool = False):
+    @staticmethod
+    def _timing_lines() -> List[str]:
+        """Report lines for phase durations and API latencies recorded so far in this process"""
+        histograms = metrics.summary()['histograms']
+        lines = []
+        phases = histograms.get('rbac_sync_phase_seconds', [])
+        if phases:
+            lines.append("\n⏱️  Timings: " + ", ".join(f"{p['labels']['phase']} {p['sum']:.2f}s" for p in phases))
+        
+        def latency(name: str) -> Optional[str]:
+            series = histograms.get(name, [])
+            count = sum(s['count'] for s in series)
+            if not count:
+                return None
+            total = sum(s['sum'] for s in series)
+            return f"{count} calls, {total:.2f}s total, slowest {max(s['max'] for s in series):.3f}s"
+        
+        queries = latency('rbac_sync_snowflake_query_seconds')
+        if queries:
+            lines.append(f"   Snowflake queries: {queries}")
+        http_calls = latency('rbac_sync_http_request_seconds')
+        if http_calls:
+            lines.append(f"   HTTP calls: {http_calls}, {metrics.total('rbac_sync_http_retries_total'):g} retries, "
+                         f"{metrics.total('rbac_sync_http_throttled_total'):g} throttled (429)")
+        return lines
+    
+    def write_metrics(self):
+        """Write the Prometheus textfile and the JSON run summary, when configured"""
+        metrics_config = self.config.get('metrics', {})
+        try:
+            if metrics_config.get('prometheus_path'):
+                metrics.write_prometheus(metrics_config['prometheus_path'])
+            if metrics_config.get('summary_path'):
+                metrics.write_summary(metrics_config['summary_path'], extra={'run': {
+                    'roles_exported': len(self.results['exported_roles']),
+                    'grants_exported': sum(len(g) for g in self.results['exported_roles'].values()),
+                    'permissions_mapped': len(self.results['mapped_permissions']),
+                    'sync_operations': len(self.results['sync_results']),
+                    'sync_succeeded': sum(r['success'] for r in self.results['sync_results']),
+                    'errors': len(self.results['errors'])
+                }})
+        except OSError as e:
+            logger.warning(f"⚠️  Could not write metrics: {str(e)}")
+    
+    def run_watch(self, dry_run: bool = False, interval: Optional[float] = None,
+                  max_cycles: Optional[int] = None) -> bool:
+        """Long-running mode: one full reconcile, then follow grant changes
+        
+        The Snowflake connection, HTTP session and Fabric token stay open
+        between cycles. Every `interval` seconds the watched roles are
+        fingerprinted (see SnowflakeRBACExporter.role_fingerprints); changed
+        roles are re-exported and re-mapped, and only the workspace users
+        whose assignment can depend on them are reconciled. SIGTERM or SIGINT
+        stops the loop once the current cycle finishes. Export files are
+        written on the first cycle only; the mapping file and a single report
+        file (watch.report_path) are kept current.
+        """
+        watch_config = self.config.get('watch', {})
+        interval = interval or watch_config.get('interval', 300)
+        stop = threading.Event()
+        previous_handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous_handlers[signum] = signal.signal(signum, lambda *_: stop.set())
+        
+        logger.info(f"👀 Watch mode: checking for grant changes every {interval:g}s "
+                    f"{'(DRY RUN) ' if dry_run else ''}- send SIGTERM to stop")
+        try:
+            # Baseline before exporting, so a change made mid-export is caught next cycle
+            if not self._connect_exporter(keep_alive=True):
+                return False
+            self.fingerprints = self._watch_fingerprints(self.config['snowflake']['roles_to_export'])
+            if not (self.run_export(keep_connection=True) and self.run_mapping()
+                    and self.run_sync(dry_run=dry_run, reconcile=True)):
+                logger.error("❌ Watch aborted: initial sync failed")
+                return False
+            self.generate_report(watch_config.get('report_path', WATCH_REPORT_PATH))
+            self.fingerprints.update(self._watch_fingerprints(
+                [role for role in self.results['inherited_roles'] if role not in self.fingerprints]
+            ))
+            
+            cycles = 1
+            self.write_metrics()
+            while not stop.wait(interval) and not (max_cycles and cycles >= max_cycles):
+                self._watch_cycle(dry_run)
+                self.write_metrics()
+                cycles += 1
+            logger.info(f"🛑 Watch stopped after {cycles} cycles")
+            return True
+        
+        except Exception as e:
+            logger.error(f"❌ Watch failed: {str(e)}")
+            self.results['errors'].append(f"Watch error: {str(e)}")
+            return False
+        
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+            if self.exporter:
+                self.exporter.close()
+            if self.syncer:
+                self.syncer.close()
+    
+    def _watch_fingerprints(self, roles: List[str]) -> Dict[str, Optional[str]]:
+        identity_config = self.config.get('identity', {})
+        return self.exporter.role_fingerprints(
+            roles,
+            include_members=identity_config.get('expand_users', False) or identity_config.get('principal_mode') == 'group',
+            use_account_usage=self.config.get('watch', {}).get('change_source') == 'account_usage'
+        )
+    
+    @timed('rbac_sync_phase_seconds', phase='watch_cycle')
+    def _watch_cycle(self, dry_run: bool) -> bool:
+        """One watch iteration: find changed roles, then re-export, re-map and reconcile what they affect"""
+        watched = list(dict.fromkeys([*self.config['snowflake']['roles_to_export'], *self.results['inherited_roles']]))
+        try:
+            if not self._connect_exporter(keep_alive=True):
+                return False
+            current = self._watch_fingerprints(watched)
+        except Exception as e:
+            logger.warning(f"⚠️  Grant change check failed, reconnecting next cycle: {str(e)}")
+            try:
+                self.exporter.close()
+            except Exception:
+                self.exporter.conn = None
+            return False
+        
+        changed = {role for role, value in current.items() if self.fingerprints.get(role, value) != value}
+        self.fingerprints.update(current)
+        if not changed:
+            logger.info("👀 No grant changes")
+            return True
+        
+        logger.info(f"🔄 Grants changed for {len(changed)} roles: {', '.join(sorted(changed))}")
+        self.results['sync_results'] = []
+        self.results['errors'] = []
+        affected = self._refresh_changed_roles(changed)
+        if not affected:
+            return True
+        
+        before = [p for p in self.results['mapped_permissions'] if p.snowflake_role in affected]
+        if not self.run_mapping(roles=affected):
+            return False
+        
+        principals = None
+        if self.config.get('identity', {}).get('principal_mode') != 'group':
+            after = [p for p in self.results['mapped_permissions'] if p.snowflake_role in affected]
+            principals = {p.email.lower() for p in before + after}
+        synced = self.run_sync(dry_run=dry_run, reconcile=True, principals=principals)
+        self.generate_report(self.config.get('watch', {}).get('report_path', WATCH_REPORT_PATH))
+        return synced
+    
+    def _refresh_changed_roles(self, changed: Set[str]) -> List[str]:
+        """Re-export changed roles; returns the exported roles whose mapping they can affect"""
+        roles = self.config['snowflake']['roles_to_export']
+        exported = self._export_roles(sorted(changed))
+        for role, grants in exported.items():
+            self.results['exported_roles' if role in roles else 'inherited_roles'][role] = grants
+        
+        if self.role_graph is None:
+            affected = [role for role in roles if role in changed]
+        else:
+            for role, grants in exported.items():
+                self.role_graph.set_role_grants(role, grants)
+            attempted = set(exported)
+            missing = self.role_graph.missing_roles() - attempted
+            while missing:
+                logger.info(f"🔗 Exporting {len(missing)} newly inherited roles")
+                attempted |= missing
+                inherited = self._export_roles(sorted(missing))
+                self.results['inherited_roles'].update(inherited)
+                for role, grants in inherited.items():
+                    self.role_graph.set_role_grants(role, grants)
+                missing = self.role_graph.missing_roles() - attempted
+            affected = [role for role in roles if self.role_graph.closure(role) & changed]
+        
+        identity_config = self.config.get('identity', {})
+        if affected and (identity_config.get('expand_users', False) or identity_config.get('principal_mode') == 'group'):
+            self.results['role_members'].update(self.exporter.export_role_members(
+                affected, use_account_usage=self.config['snowflake'].get('use_account_usage', False)
+            ))
+        return affected
+    
+    def run_full_migration(self, dry_run: bool = False) -> bool:
         """Execute complete migration workflow"""
         logger.info("\n" + "=" * 80)
         logger.info("STARTING RBAC MIGRATION WORKFLOW")
         logger.info("=" * 80 + "\n")
         
+        if self.config.get('pipeline', {}).get('enabled', False):
+            fabric_config = self.config['fabric']
+            if (fabric_config.get('reconcile') or fabric_config.get('workspaces')
+                    or self.config.get('identity', {}).get('principal_mode') == 'group'):
+                # These need the complete mapping before the first Fabric call
+                logger.warning("⚠️  Pipeline mode does not support reconcile, multi-workspace or group mode - "
+                               "running phases in sequence")
+            else:
+                if not self.run_pipeline(dry_run=dry_run):
+                    logger.error("❌ Migration aborted: Pipeline failed")
+                    return False
+                self.generate_report()
+                logger.info("\n✅ RBAC MIGRATION COMPLETE\n")
+                return True
+        
         # Step 1: Export
         if not self.run_export():
             logger.error("❌ Migration aborted: Export failed")
-            return
+            return False
         
         # Step 2: Map
         if not self.run_mapping():
             logger.error("❌ Migration aborted: Mapping failed")
-            return
+            return False
         
         # Step 3: Sync
         if not self.run_sync(dry_run=dry_run):
             logger.error("❌ Migration aborted: Sync failed")
-            return
+            return False
         
         # Generate report
         self.generate_report()
         
         logger.info("\n✅ RBAC MIGRATION COMPLETE\n")
+        return True
 
 
-def main():
-    """Main execution function"""
-    
-    # Load environment variables from .env file
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    # Log pandas availability
-    if not HAS_PANDAS:
-        logger.warning("⚠️  pandas not installed - using built-in csv module for exports")
-    
-    # Configuration
+def load_workspaces(path: Optional[str]) -> Optional[List[Dict]]:
+    """Workspace list for fan-out sync from a JSON file (see fabric_workspaces.example.json)"""
+    if not path:
+        return None
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return data['workspaces'] if isinstance(data, dict) else data
+
+
+SECRET_CONFIG_KEYS = ('password', 'client_secret')
+
+
+def build_config() -> Dict:
+    """Migration config from environment variables (load the .env file first)"""
     # IMPORTANT: In production, use Azure Key Vault or environment variables
-    config = {
+    return {
         'snowflake': {
             'account': os.getenv('SNOWFLAKE_ACCOUNT', 'your-account'),  # e.g., 'abc12345.east-us-2.azure'
             'user': os.getenv('SNOWFLAKE_USER', 'TYLER_RABIGER'),
             'password': os.getenv('SNOWFLAKE_PASSWORD', 'your-password'),
             'warehouse': os.getenv('SNOWFLAKE_WAREHOUSE', 'COMPUTE_WH'),
+            'use_account_usage': os.getenv('SNOWFLAKE_USE_ACCOUNT_USAGE', 'false').lower() == 'true',
+            'export_workers': int(os.getenv('SNOWFLAKE_EXPORT_WORKERS', '1')),
+            'role_timeout': int(os.getenv('SNOWFLAKE_ROLE_TIMEOUT')) if os.getenv('SNOWFLAKE_ROLE_TIMEOUT') else None,
+            'snapshot_path': os.getenv('SNOWFLAKE_SNAPSHOT_PATH'),
+            'include_inherited_roles': os.getenv('SNOWFLAKE_INCLUDE_INHERITED_ROLES', 'false').lower() == 'true',
+            'streaming': os.getenv('SNOWFLAKE_STREAMING_EXPORT', 'false').lower() == 'true',
+            'columnar': os.getenv('SNOWFLAKE_COLUMNAR_GRANTS', 'false').lower() == 'true',
             'roles_to_export': [
                 'FINANCE_ADMIN',
                 'FINANCE_ANALYST',
@@ -557,25 +4330,149 @@ def main():
                 'BUDGET_ANALYST'
             ]
         },
+        'mapping': {
+            'rules_path': os.getenv('MAPPING_RULES_PATH'),
+            'effective_privileges': os.getenv('MAPPING_EFFECTIVE_PRIVILEGES', 'false').lower() == 'true',
+            'batch_analysis': os.getenv('MAPPING_BATCH_ANALYSIS', 'false').lower() == 'true',
+            'cache_path': os.getenv('MAPPING_CACHE_PATH'),
+            'cache_max_entries': int(os.getenv('MAPPING_CACHE_MAX_ENTRIES', '50000'))
+        },
+        'identity': {
+            'expand_users': os.getenv('EXPAND_ROLE_MEMBERS', 'false').lower() == 'true',
+            'principal_mode': os.getenv('FABRIC_PRINCIPAL_MODE', 'user').lower(),
+            'group_name_template': os.getenv('FABRIC_GROUP_NAME_TEMPLATE', 'sg-fabric-{role}'),
+            'group_directory': os.getenv('GROUP_DIRECTORY', 'graph').lower(),
+            'resolver': os.getenv('IDENTITY_RESOLVER', 'graph'),
+            'static_map_path': os.getenv('IDENTITY_STATIC_MAP_PATH'),
+            'cache_ttl': int(os.getenv('IDENTITY_CACHE_TTL', '86400')),
+            'cache_path': os.getenv('IDENTITY_CACHE_PATH')
+        },
+        'metrics': {
+            'prometheus_path': os.getenv('METRICS_PROMETHEUS_PATH'),
+            'summary_path': os.getenv('METRICS_SUMMARY_PATH')
+        },
+        'watch': {
+            'interval': float(os.getenv('WATCH_INTERVAL_SECONDS', '300')),
+            'change_source': os.getenv('WATCH_CHANGE_SOURCE', 'live').lower(),
+            'report_path': os.getenv('WATCH_REPORT_PATH', WATCH_REPORT_PATH)
+        },
+        'pipeline': {
+            'enabled': os.getenv('MIGRATION_PIPELINE', 'false').lower() == 'true',
+            'queue_depth': int(os.getenv('PIPELINE_QUEUE_DEPTH', '16')),
+            'export_batch_size': int(os.getenv('PIPELINE_EXPORT_BATCH_SIZE', '100'))
+        },
+        'output': {
+            'grant_store_path': os.getenv('GRANT_STORE_PATH'),
+            'format': os.getenv('OUTPUT_FORMAT', 'csv'),
+            'directory': os.getenv('OUTPUT_DIR', '.'),
+            'compression': os.getenv('OUTPUT_COMPRESSION', 'zstd'),
+            'max_rows_per_file': int(os.getenv('OUTPUT_MAX_ROWS_PER_FILE', '5000000'))
+        },
         'fabric': {
             'workspace_id': os.getenv('FABRIC_WORKSPACE_ID', 'your-workspace-id'),
             'tenant_id': os.getenv('AZURE_TENANT_ID', 'your-tenant-id'),
             'client_id': os.getenv('AZURE_CLIENT_ID', 'your-client-id'),
-            'client_secret': os.getenv('AZURE_CLIENT_SECRET', 'your-client-secret')
+            'client_secret': os.getenv('AZURE_CLIENT_SECRET', 'your-client-secret'),
+            'connect_timeout': float(os.getenv('FABRIC_CONNECT_TIMEOUT', '5')),
+            'read_timeout': float(os.getenv('FABRIC_READ_TIMEOUT', '30')),
+            'max_retries': int(os.getenv('FABRIC_MAX_RETRIES', '5')),
+            'token_cache_path': os.getenv('FABRIC_TOKEN_CACHE_PATH') or None,
+            'api_base_url': os.getenv('FABRIC_API_BASE_URL') or FABRIC_API_BASE_URL,
+            'login_base_url': os.getenv('FABRIC_LOGIN_BASE_URL') or LOGIN_BASE_URL,
+            'concurrency': int(os.getenv('FABRIC_SYNC_CONCURRENCY', '1')),
+            'rate_limit': float(os.getenv('FABRIC_RATE_LIMIT', '10')),
+            'workspaces': load_workspaces(os.getenv('FABRIC_WORKSPACES_PATH')),
+            'workspace_parallelism': int(os.getenv('FABRIC_WORKSPACE_PARALLELISM', '4')),
+            'journal_path': os.getenv('FABRIC_SYNC_JOURNAL_PATH') or None,
+            'resume': os.getenv('FABRIC_SYNC_RESUME', 'false').lower() == 'true',
+            'reconcile': os.getenv('FABRIC_RECONCILE', 'false').lower() == 'true',
+            'allow_removals': os.getenv('FABRIC_ALLOW_REMOVALS', 'false').lower() == 'true'
         }
     }
+
+
+def masked_config(config: Dict) -> Dict:
+    """Copy of the config with credentials replaced by ***"""
+    if isinstance(config, dict):
+        return {key: '***' if key in SECRET_CONFIG_KEYS and value else masked_config(value)
+                for key, value in config.items()}
+    if isinstance(config, list):
+        return [masked_config(item) for item in config]
+    return config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Migrate Snowflake RBAC grants to Microsoft Fabric workspace roles')
+    parser.add_argument('--env-file', default=None, help='.env file to load (default: search from the working directory)')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG, INFO, WARNING or ERROR')
+    parser.add_argument('--log-file', default=None, help='log file path (default: rbac_sync_<timestamp>.log)')
+    parser.add_argument('--no-log-file', action='store_true', help='log to the console only')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    run = commands.add_parser('run', help='export, map and sync to Fabric (the default; dry run unless --live)')
+    run.add_argument('--live', action='store_true', help='apply permission changes in Fabric')
+    commands.add_parser('plan', help='export and map only, writing the mapping without calling Fabric')
+    watch = commands.add_parser('watch', help='stay running and reconcile roles whose grants change (dry run unless --live)')
+    watch.add_argument('--live', action='store_true', help='apply permission changes in Fabric')
+    watch.add_argument('--interval', type=float, default=None, help='seconds between change checks (WATCH_INTERVAL_SECONDS)')
+    commands.add_parser('config', help='print the resolved configuration with secrets masked')
+    args = parser.parse_args(argv)
+    if args.command is None:
+        args.command, args.live = 'run', False
+    return args
+
+
+def main(argv=None) -> int:
+    """Command-line entry point"""
+    try:
+        code = _run_cli(argv)
+        # Flush while we can still catch a closed pipe (e.g. `config | head`)
+        sys.stdout.flush()
+        return code
+    except BrokenPipeError:
+        # Send the rest to devnull so the interpreter's final flush does not fail again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+
+def _run_cli(argv=None) -> int:
+    args = parse_args(argv)
     
-    # Create orchestrator
-    orchestrator = RBACMigrationOrchestrator(config)
+    # Load environment variables from .env file
+    from dotenv import load_dotenv
+    load_dotenv(args.env_file)
+    config = build_config()
+    
+    if args.command == 'config':
+        print(json.dumps(masked_config(config), indent=2, default=str))
+        return 0
+    
+    log_file = None if args.no_log_file else (
+        args.log_file or f'rbac_sync_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+    )
+    configure_logging(args.log_level, log_file)
     
-    # Run migration (dry run first to test)
-    print("\n🔍 RUNNING DRY RUN (no actual permissions will be changed)\n")
-    orchestrator.run_full_migration(dry_run=True)
+    # Log pandas availability
+    if not HAS_PANDAS:
+        logger.warning("⚠️  pandas not installed - using built-in csv module for exports")
+    
+    orchestrator = RBACMigrationOrchestrator(config)
     
-    # Uncomment below to run actual sync
-    # print("\n⚠️  RUNNING LIVE SYNC (permissions will be changed in Fabric)\n")
-    # orchestrator.run_full_migration(dry_run=False)
+    try:
+        if args.command == 'plan':
+            ok = orchestrator.run_export() and orchestrator.run_mapping()
+            return 0 if ok else 1
+        
+        if args.live:
+            print("\n⚠️  RUNNING LIVE SYNC (permissions will be changed in Fabric)\n")
+        else:
+            print("\n🔍 RUNNING DRY RUN (no actual permissions will be changed)\n")
+        
+        if args.command == 'watch':
+            return 0 if orchestrator.run_watch(dry_run=not args.live, interval=args.interval) else 1
+        return 0 if orchestrator.run_full_migration(dry_run=not args.live) else 1
+    finally:
+        orchestrator.write_metrics()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+FabCon Global Hack 2025 - RBAC Mapping Tests
+Grant analysis and Snowflake -> Fabric mapping, no credentials needed
+
+    python -m pytest scripts/test_rbac_mapping.py
+"""
+
+import pytest
+
+from rbac_sync_automation import FabricPermissionMapper, GrantTable, MappingDecisionTable, RoleGraph, SnowflakeGrant
+
+
+def grant(role, privilege, granted_on, name):
+    return SnowflakeGrant(role=role, privilege=privilege, granted_on=granted_on, name=name, granted_by='SYSADMIN')
+
+
+# PARENT inherits CHILD; only PARENT holds DELETE
+HIERARCHY = [
+    grant('PARENT', 'DELETE', 'TABLE', 'DB.S.INVOICES'),
+    grant('PARENT', 'USAGE', 'ROLE', 'CHILD'),
+    grant('CHILD', 'SELECT', 'TABLE', 'DB.S.INVOICES'),
+    grant('CHILD', 'USAGE', 'DATABASE', 'DB'),
+]
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_batch_analysis_of_effective_grants_matches_per_role(columnar):
+    pytest.importorskip('pandas')
+    table = GrantTable.from_grants(HIERARCHY)
+    by_role = table.by_role() if columnar else {
+        role: [g for g in HIERARCHY if g.role == role] for role in ('PARENT', 'CHILD')
+    }
+    graph = RoleGraph.from_grants(by_role)
+    effective = {role: graph.effective_grants(role) for role in ('PARENT', 'CHILD')}
+
+    batch = FabricPermissionMapper.analyze_grants_batch(effective)
+    for role, grants in effective.items():
+        expected = FabricPermissionMapper.analyze_grants(list(grants))
+        row = batch.loc[role]
+        assert row['total_grants'] == expected['total_grants'], role
+        for flag in ('has_delete', 'has_insert_update', 'has_select_only', 'database_usage', 'warehouse_usage'):
+            assert bool(row[flag]) == expected[flag], (role, flag)
+
+    assert batch.loc['PARENT', 'total_grants'] == 3
+    assert batch.loc['CHILD', 'total_grants'] == 2
+    assert bool(batch.loc['PARENT', 'has_delete'])
+
+
+@pytest.mark.parametrize('rules', [None, {'rules': [], 'roles': {'NO_EMAIL': {'fabric_role': 'Viewer'}}}])
+def test_role_email_env_applies_to_explicit_entries(rules, monkeypatch):
+    monkeypatch.setitem(FabricPermissionMapper.ROLE_MAPPINGS, 'NO_EMAIL', {'fabric_role': 'Viewer', 'reasoning': ''})
+    decision_table = MappingDecisionTable.from_dict(rules) if rules else None
+    grants = [grant('NO_EMAIL', 'SELECT', 'TABLE', 'DB.S.T')]
+
+    assert FabricPermissionMapper.map_role('NO_EMAIL', grants, decision_table).email is None
+    monkeypatch.setenv('NO_EMAIL_EMAIL', 'someone@contoso.com')
+    assert FabricPermissionMapper.map_role('NO_EMAIL', grants, decision_table).email == 'someone@contoso.com'
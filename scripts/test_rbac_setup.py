@@ -4,7 +4,8 @@ FabCon Global Hack 2025 - RBAC Sync Test Script
 Quick validation of Snowflake and Fabric connectivity
 
 Run this BEFORE running the full rbac_sync_automation.py script
-to ensure your configuration is correct.
+to ensure your configuration is correct. Credential-free startup checks
+live in test_rbac_startup.py.
 
 Author: Tyler Rabiger
 """
@@ -243,7 +244,7 @@ print("✅ ALL TESTS PASSED - Ready to run rbac_sync_automation.py")
 print("=" * 80)
 print()
 print("Next steps:")
-print("1. Run dry run: python rbac_sync_automation.py")
+print("1. Run dry run: python rbac_sync_automation.py run")
 print("2. Review generated CSV files and logs")
-print("3. If satisfied, edit script to run live sync (uncomment line at bottom)")
+print("3. If satisfied, run live sync: python rbac_sync_automation.py run --live")
 print()
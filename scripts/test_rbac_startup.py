@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+FabCon Global Hack 2025 - RBAC Sync Startup Tests
+Credential-free checks that the CLI stays fast and side-effect free
+
+The offline commands (--help, config) must not load heavy dependencies or
+leave files behind. Needs no Snowflake or Fabric access:
+
+    python -m pytest scripts/test_rbac_startup.py
+
+Raise STARTUP_BUDGET_SECONDS on slow machines.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLI_PATH = os.path.join(SCRIPT_DIR, 'rbac_sync_automation.py')
+STARTUP_BUDGET = float(os.getenv('STARTUP_BUDGET_SECONDS', '1.0'))
+HEAVY_MODULES = ['snowflake.connector', 'requests', 'pandas', 'pyarrow']
+
+
+def run_cli(args, cwd, **kwargs):
+    return subprocess.run([sys.executable, CLI_PATH, *args], cwd=cwd, capture_output=True, text=True, **kwargs)
+
+
+@pytest.mark.parametrize('command', [['--help'], ['config']])
+def test_offline_command_starts_within_budget(command, tmp_path):
+    start = time.perf_counter()
+    result = run_cli(command, tmp_path)
+    elapsed = time.perf_counter() - start
+
+    assert result.returncode == 0, result.stderr
+    assert elapsed <= STARTUP_BUDGET, f"{' '.join(command)} took {elapsed:.2f}s (budget {STARTUP_BUDGET:.2f}s)"
+
+
+@pytest.mark.parametrize('command', [['--help'], ['config']])
+def test_offline_command_leaves_no_files(command, tmp_path):
+    run_cli(command, tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_import_loads_no_heavy_modules(tmp_path):
+    probe = subprocess.run(
+        [sys.executable, '-c',
+         f"import sys; sys.path.insert(0, {SCRIPT_DIR!r}); import rbac_sync_automation; "
+         f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"],
+        cwd=tmp_path, capture_output=True, text=True
+    )
+    assert probe.returncode == 0, probe.stderr
+    assert probe.stdout.split() == []
+
+
+def test_config_into_closed_pipe_exits_quietly(tmp_path):
+    # Like `rbac_sync_automation.py config | head -0`: the reader is gone before anything is written
+    process = subprocess.Popen(
+        [sys.executable, CLI_PATH, 'config'], cwd=tmp_path,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    process.stdout.close()
+    stderr = process.stderr.read()
+    process.wait()
+
+    assert 'Traceback' not in stderr
+    assert 'BrokenPipeError' not in stderr
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+FabCon Global Hack 2025 - RBAC Sync Tests
+Export -> mapping -> sync against an in-memory Snowflake and the mock Fabric API
+
+Needs no Snowflake or Fabric access (fixtures live in conftest.py):
+
+    python -m pytest scripts/test_rbac_sync.py
+"""
+
+import json
+import os
+import stat
+import threading
+
+import pytest
+
+import rbac_sync_automation
+from rbac_sync_automation import (
+    FABRIC_API_SCOPE, AsyncPermissionSyncEngine, FabricPermission, GraphGroupDirectory, RBACMigrationOrchestrator,
+    TokenProvider
+)
+
+
+def run_with_timeout(target, timeout=20.0):
+    """Run target on a daemon thread, failing the test instead of hanging it"""
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.setdefault('result', target()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"{target.__name__} did not finish within {timeout:g}s"
+    return outcome.get('result')
+
+
+def test_pipeline_sync_failure_stops_all_stages(fake_snowflake, config, monkeypatch):
+    config['pipeline'] = {'enabled': True, 'export_batch_size': 1, 'queue_depth': 1}
+    orchestrator = RBACMigrationOrchestrator(config)
+
+    export_roles = orchestrator._export_roles
+    started = threading.Event()
+
+    def slow_export(roles):
+        # Keep the export stage busy until the sync stage has failed
+        started.set()
+        threading.Event().wait(0.3)
+        return export_roles(roles)
+
+    def failing_stream(self, source, dry_run=False):
+        started.wait(5)
+        raise RuntimeError("sync stage crashed")
+
+    monkeypatch.setattr(orchestrator, '_export_roles', slow_export)
+    monkeypatch.setattr(AsyncPermissionSyncEngine, 'run_stream', failing_stream)
+
+    assert run_with_timeout(lambda: orchestrator.run_pipeline(dry_run=True)) is False
+    assert any('sync stage crashed' in error for error in orchestrator.results['errors'])
+    assert not [t for t in threading.enumerate() if t.name.startswith('pipeline-')]
+
+
+def test_token_cache_survives_concurrent_writers(fabric_server, tmp_path):
+    cache_path = str(tmp_path / 'tokens.json')
+    providers = [
+        TokenProvider('tenant', f'client-{i}', 'secret', FABRIC_API_SCOPE, cache_path=cache_path,
+                      login_base_url=fabric_server.base_url)
+        for i in range(8)
+    ]
+    errors = []
+
+    def churn(provider):
+        try:
+            for _ in range(25):
+                provider.token()
+                provider.invalidate()
+            provider.token()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=churn, args=(p,)) for p in providers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with open(cache_path) as f:
+        assert len(json.load(f)) == len(providers)
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.body
+
+
+class FakeGraphSession:
+    """Just enough of Graph groups: search, create (optionally timing out once) and $batch removal"""
+
+    def __init__(self, fail_first_create=False, removal_status=204):
+        self.groups = {}
+        self.creates = 0
+        self.fail_first_create = fail_first_create
+        self.removal_status = removal_status
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        name = params['$filter'].split("'")[1]
+        return FakeResponse(200, {'value': [{'id': self.groups[name]}] if name in self.groups else []})
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        if url.endswith('/$batch'):
+            return FakeResponse(200, {'responses': [
+                {'id': item['id'], 'status': self.removal_status, 'body': {}} for item in json['requests']
+            ]})
+        self.creates += 1
+        self.groups[json['displayName']] = f"group-{self.creates}"
+        if self.fail_first_create and self.creates == 1:
+            # The create landed, but the client never saw the response
+            raise ConnectionError("read timed out")
+        return FakeResponse(201, {'id': f"group-{self.creates}"})
+
+
+class StaticToken:
+    def token(self):
+        return 'token'
+
+
+def test_group_create_never_uses_a_post_retrying_session(monkeypatch):
+    monkeypatch.setattr(rbac_sync_automation.time, 'sleep', lambda seconds: None)
+    caller_session = FakeGraphSession()
+    directory = GraphGroupDirectory('tenant', 'client', 'secret', session=caller_session, token_provider=StaticToken())
+    assert directory.create_session is not caller_session
+    assert directory.create_session.adapters['https://'].max_retries.allowed_methods == frozenset({'GET'})
+
+    # A create that timed out after landing is found by the next search, not created twice
+    directory.session = directory.create_session = FakeGraphSession(fail_first_create=True)
+    assert directory.ensure_group('sg-fabric-finance_admin') == 'group-1'
+    assert directory.create_session.creates == 1
+
+
+@pytest.mark.parametrize('status, fails', [(204, False), (404, False), (403, True), (503, True)])
+def test_group_member_removal_reports_failed_batch_items(status, fails):
+    directory = GraphGroupDirectory('tenant', 'client', 'secret', session=FakeGraphSession(removal_status=status),
+                                    token_provider=StaticToken())
+    if fails:
+        with pytest.raises(RuntimeError, match='Failed to remove 25 members'):
+            directory.remove_members('group-1', [f"user-{i}" for i in range(25)])
+    else:
+        directory.remove_members('group-1', [f"user-{i}" for i in range(25)])
+
+
+def test_concurrent_sync_reports_only_this_runs_results(fake_snowflake, role_emails, config, caplog):
+    config['fabric']['concurrency'] = 4
+    orchestrator = RBACMigrationOrchestrator(config)
+    # Results left over from an earlier watch cycle
+    orchestrator.results['sync_results'] = [{'email': 'old@contoso.com', 'role': 'Viewer', 'success': True}] * 5
+
+    assert orchestrator.run_export() and orchestrator.run_mapping()
+    with caplog.at_level('INFO', logger='rbac_sync_automation'):
+        assert orchestrator.run_sync()
+
+    assert 'Successfully synced 3/3 permissions' in caplog.text
+    assert len(orchestrator.results['sync_results']) == 8
+
+
+def workspace_roles(fabric_server, workspace_id='ws-test'):
+    return {email: user['groupUserAccessRight'] for email, user in fabric_server.state.workspaces[workspace_id].items()}
+
+
+def mapped_roles(orchestrator):
+    return {p.email: p.role for p in orchestrator.results['mapped_permissions']}
+
+
+def test_sync_assigns_every_mapped_role(fake_snowflake, role_emails, config, fabric_server):
+    orchestrator = RBACMigrationOrchestrator(config)
+    assert orchestrator.run_export() and orchestrator.run_mapping()
+    assert orchestrator.run_sync()
+
+    assert set(mapped_roles(orchestrator)) == set(role_emails.values())
+    assert workspace_roles(fabric_server) == mapped_roles(orchestrator)
+    assert all(r['success'] for r in orchestrator.results['sync_results'])
+
+
+def test_reconcile_pages_through_members_and_applies_only_the_difference(fake_snowflake, role_emails, config,
+                                                                          fabric_server):
+    # Several pages of stale users, plus one mapped user already holding the wrong role
+    fabric_server.state.max_page_size = 40
+    fabric_server.state.seed_users('ws-test', 130, prefix='stale')
+    analyst = role_emails['FINANCE_ANALYST']
+    fabric_server.state.workspaces['ws-test'][analyst] = {
+        'emailAddress': analyst, 'identifier': analyst, 'groupUserAccessRight': 'Admin', 'principalType': 'User'
+    }
+    config['fabric'].update(reconcile=True, allow_removals=True)
+    orchestrator = RBACMigrationOrchestrator(config)
+    assert orchestrator.run_export() and orchestrator.run_mapping()
+    assert orchestrator.run_sync()
+
+    plan = orchestrator.results['reconciliation']
+    assert (plan['add'], plan['update'], plan['remove']) == (2, 1, 130)
+    assert workspace_roles(fabric_server) == mapped_roles(orchestrator)
+
+
+def test_resumed_sync_only_resends_what_did_not_complete(fake_snowflake, role_emails, config, fabric_server,
+                                                         tmp_path, monkeypatch):
+    config['fabric']['journal_path'] = str(tmp_path / 'sync.journal')
+    flaky_email = role_emails['AP_MANAGER']
+    request_workspace_user = rbac_sync_automation.FabricWorkspaceSync.request_workspace_user
+
+    def drop_one(self, action, permission):
+        if permission.email == flaky_email:
+            raise ConnectionError("connection reset by peer")
+        return request_workspace_user(self, action, permission)
+
+    monkeypatch.setattr(rbac_sync_automation.FabricWorkspaceSync, 'request_workspace_user', drop_one)
+    first = RBACMigrationOrchestrator(config)
+    assert first.run_export() and first.run_mapping() and first.run_sync()
+    assert flaky_email not in workspace_roles(fabric_server)
+
+    monkeypatch.setattr(rbac_sync_automation.FabricWorkspaceSync, 'request_workspace_user', request_workspace_user)
+    config['fabric']['resume'] = True
+    fabric_server.state.reset(fabric_server.state.workspaces)
+    second = RBACMigrationOrchestrator(config)
+    assert second.run_export() and second.run_mapping() and second.run_sync()
+
+    assert second.results['journal']['skipped'] == 2
+    assert fabric_server.state.stats['requests'] == 1
+    assert workspace_roles(fabric_server) == mapped_roles(second)
+
+
+def test_concurrent_sync_backs_off_on_429(config, fabric_server):
+    # The mock admits 4 calls a second and asks throttled callers to retry after 1s
+    fabric_server.state.rate_limit = 4
+    fabric_server.state.retry_after = 1
+    config['fabric']['concurrency'] = 4
+    orchestrator = RBACMigrationOrchestrator(config)
+    orchestrator.results['mapped_permissions'] = [
+        FabricPermission(email=f"user{i}@contoso.com", role='Viewer', snowflake_role='ANALYST',
+                         grant_count=1, reasoning='') for i in range(6)
+    ]
+
+    assert run_with_timeout(orchestrator.run_sync)
+
+    assert fabric_server.state.stats['throttled'] >= 1
+    assert all(r['success'] for r in orchestrator.results['sync_results'])
+    assert len(workspace_roles(fabric_server)) == 6